@@ -1,11 +1,14 @@
 # Extensible AI agents library with LangChain and MCP
 
-from .agents import BaseAgent, SearchAgent, ChatAgent, AgentConfig, AgentResponse
+from .agents import BaseAgent, SearchAgent, ChatAgent, AgentConfig, AgentResponse, ModelRoute
+from .retrieval import CatalogIndex
 
 __all__ = [
     "BaseAgent",
     "SearchAgent", 
     "ChatAgent",
     "AgentConfig",
-    "AgentResponse"
+    "AgentResponse",
+    "ModelRoute",
+    "CatalogIndex"
 ]
@@ -1,7 +1,10 @@
 # Extensible AI agents with LangChain and MCP support
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import os
+import json
+import time
+import asyncio
 import logging
 from dataclasses import dataclass
 from langchain_openai import ChatOpenAI
@@ -12,12 +15,24 @@ from pydantic import BaseModel
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ModelRoute:
+    # Which model serves an agent, and when to hedge to a faster fallback
+    primary: str
+    fallback: Optional[str] = None
+    hedge_after_seconds: Optional[float] = None
+
+
 @dataclass
 class AgentConfig:
     # AI agent configuration
     api_base_url: str = None
     model_name: str = None
     api_key: str = None
+    fallback_model_name: str = None
+    hedge_after_seconds: float = None
+    timeout_seconds: float = None
+    model_routes: Dict[str, ModelRoute] = None
     
     def __post_init__(self):
         # Load from env if not provided
@@ -28,6 +43,26 @@ class AgentConfig:
         if self.api_key is None:
             # LITELLM_AUTH_TOKEN for AI API
             self.api_key = os.getenv("LITELLM_AUTH_TOKEN", "dummy-key")
+        if self.fallback_model_name is None:
+            self.fallback_model_name = os.getenv("AI_FALLBACK_MODEL_NAME") or None
+        if self.hedge_after_seconds is None and os.getenv("AI_HEDGE_AFTER_SECONDS"):
+            self.hedge_after_seconds = float(os.getenv("AI_HEDGE_AFTER_SECONDS"))
+        if self.timeout_seconds is None:
+            self.timeout_seconds = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+        if self.model_routes is None:
+            # AI_MODEL_ROUTES: {"chat": {"primary": "...", "fallback": "...", "hedge_after_seconds": 3}}
+            routes = json.loads(os.getenv("AI_MODEL_ROUTES", "{}"))
+            self.model_routes = {name: ModelRoute(**route) for name, route in routes.items()}
+    
+    def route_for(self, name: str) -> ModelRoute:
+        # Per-agent route, else the global model with optional fallback
+        if name in self.model_routes:
+            return self.model_routes[name]
+        return ModelRoute(
+            primary=self.model_name,
+            fallback=self.fallback_model_name,
+            hedge_after_seconds=self.hedge_after_seconds
+        )
 
 
 class AgentResponse(BaseModel):
@@ -41,22 +76,32 @@ class AgentResponse(BaseModel):
 class BaseAgent:
     # Base AI agent with LangChain and MCP support
     
+    # Key into AgentConfig.model_routes
+    route_name = "default"
+    
     def __init__(self, config: AgentConfig, system_prompt: str = "You are a helpful AI assistant."):
         self.config = config
         self.system_prompt = system_prompt
+        self.route = config.route_for(self.route_name)
         
-        # LangChain ChatOpenAI setup
-        self.llm = ChatOpenAI(
-            base_url=config.api_base_url,
-            api_key=config.api_key,
-            model=config.model_name
-        )
+        # LangChain ChatOpenAI setup, one client per routed model
+        self._llms: Dict[str, ChatOpenAI] = {}
+        self.llm = self._llm_for(self.route.primary)
         
         # MCP client lazy init
         self.mcp_client: Optional[MultiServerMCPClient] = None
         self.mcp_tools = []
         
-        logger.info(f"Initialized {self.__class__.__name__} with model {config.model_name}")
+        logger.info(f"Initialized {self.__class__.__name__} with model {self.route.primary}")
+    
+    def _llm_for(self, model_name: str) -> ChatOpenAI:
+        if model_name not in self._llms:
+            self._llms[model_name] = ChatOpenAI(
+                base_url=self.config.api_base_url,
+                api_key=self.config.api_key,
+                model=model_name
+            )
+        return self._llms[model_name]
     
     def setup_mcp(self, server_configs: List[Dict[str, str]]):
         # Setup MCP servers
@@ -69,32 +114,84 @@ class BaseAgent:
             logger.error(f"Failed to setup MCP: {e}")
             self.mcp_client = None
     
-    async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
-        # Execute agent with prompt
+    async def _invoke(self, model_name: str, messages: list, use_tools: bool) -> Tuple[str, Any]:
+        llm = self._llm_for(model_name)
+        
+        # Use MCP tools if available
+        if use_tools and self.mcp_client and self.mcp_tools:
+            # Agent with tools
+            llm = llm.bind_tools(self.mcp_tools)
+        return model_name, await llm.ainvoke(messages)
+    
+    async def _invoke_hedged(self, messages: list, use_tools: bool) -> Tuple[str, Any, bool]:
+        # Primary first; fallback joins after the hedge delay or on primary failure, first answer wins
+        route = self.route
+        pending = {asyncio.create_task(self._invoke(route.primary, messages, use_tools))}
+        hedged = False
+        last_error: Optional[BaseException] = None
+        
+        try:
+            while pending:
+                can_hedge = route.fallback and not hedged
+                wait_for = route.hedge_after_seconds if can_hedge and route.hedge_after_seconds is not None else None
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=wait_for,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    if task.exception() is None:
+                        model_name, response = task.result()
+                        return model_name, response, hedged
+                    last_error = task.exception()
+                    logger.warning(f"Model call failed: {last_error}")
+                
+                # Slow or failed primary: bring in the fallback
+                if can_hedge and (not done or not pending):
+                    hedged = True
+                    logger.info(f"Hedging {self.__class__.__name__} request to {route.fallback}")
+                    pending.add(asyncio.create_task(self._invoke(route.fallback, messages, use_tools)))
+            
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def execute(self, prompt: str, use_tools: bool = True, timeout: Optional[float] = None) -> AgentResponse:
+        # Execute agent with prompt, cancelled once the deadline passes
+        timeout = self.config.timeout_seconds if timeout is None else timeout
+        started = time.monotonic()
         try:
             messages = [
                 SystemMessage(content=self.system_prompt),
                 HumanMessage(content=prompt)
             ]
             
-            # Use MCP tools if available
-            if use_tools and self.mcp_client and self.mcp_tools:
-                # Agent with tools
-                agent_executor = self.llm.bind_tools(self.mcp_tools)
-                response = await agent_executor.ainvoke(messages)
-            else:
-                # LLM without tools
-                response = await self.llm.ainvoke(messages)
+            model_name, response, hedged = await asyncio.wait_for(
+                self._invoke_hedged(messages, use_tools),
+                timeout=timeout
+            )
             
             return AgentResponse(
                 success=True,
                 content=response.content,
                 metadata={
-                    "model": self.config.model_name,
+                    "model": model_name,
+                    "hedged": hedged,
+                    "latency_ms": int((time.monotonic() - started) * 1000),
                     "tools_used": len(self.mcp_tools) if use_tools else 0
                 }
             )
             
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.__class__.__name__} exceeded deadline of {timeout}s")
+            return AgentResponse(
+                success=False,
+                content="",
+                metadata={"timed_out": True, "latency_ms": int((time.monotonic() - started) * 1000)},
+                error=f"Deadline of {timeout}s exceeded"
+            )
         except Exception as e:
             logger.error(f"Error executing agent: {e}")
             return AgentResponse(
@@ -114,6 +211,8 @@ class BaseAgent:
 class SearchAgent(BaseAgent):
     # Web search and research agent
     
+    route_name = "search"
+    
     def __init__(self, config: AgentConfig):
         system_prompt = "Research assistant with web search tools. Use search for current info, cite sources."
         
@@ -140,6 +239,8 @@ class SearchAgent(BaseAgent):
 class ChatAgent(BaseAgent):
     # General chat and assistance agent
     
+    route_name = "chat"
+    
     def __init__(self, config: AgentConfig):
         system_prompt = "Friendly conversational AI. Natural conversations, explanations, analysis. Helpful, harmless, honest."
         
@@ -0,0 +1,229 @@
+# In-process retrieval over the food truck catalog; no network, no LLM
+
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "is", "are",
+    "do", "does", "you", "your", "we", "our", "i", "me", "my", "have", "has", "any", "some",
+    "there", "what", "which", "where", "when", "how", "can", "get", "serve", "sell", "got",
+    "today", "tomorrow", "this", "be", "will", "it", "much", "please", "menu", "item", "items",
+}
+
+DAY_NAMES = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "mon": 0, "tue": 1, "tues": 1, "wed": 2, "thu": 3, "thur": 3, "thurs": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+
+LOCATION_INTENT = re.compile(r"\b(where|location|locations|parked|schedule|hours|open)\b")
+MENU_INTENT = re.compile(r"\b(do you (have|sell|serve|got)|is there|are there|how much|price|cost)\b")
+CONTACT_INTENT = re.compile(r"\b(phone|call|email|contact|instagram|facebook)\b")
+
+# Intent words alone ("where", "open", "facebook") are too common; these mark a question addressed to us
+LOCATION_ABOUT_US = re.compile(
+    r"\b(where (are|will|would|can|could|do|should)( i| we)? (you|y'?all|find you|catch you)"
+    r"|where('s| is) (the|your) (food )?truck|are you (open|parked|around|out)"
+    r"|when (are|do|will) you (open|close|come|be)|your (location|locations|hours|schedule|stops?|truck|spot))\b"
+)
+CONTACT_ABOUT_US = re.compile(
+    r"\b(your (phone|number|email|e-?mail|instagram|facebook|contact|socials?)"
+    r"|(call|email|contact|reach|message|follow) (you|y'?all))\b"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def stem(token: str) -> str:
+    # Crude plural folding so "tacos" matches "taco"
+    if len(token) > 4 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def content_terms(text: str) -> List[str]:
+    return [stem(t) for t in tokenize(text) if t not in STOPWORDS and t not in DAY_NAMES]
+
+
+def schedule_days(schedule: Optional[str]) -> set:
+    # "Mon-Fri: 11:30AM-2:30PM" -> {0..4}; unparseable schedules match every day
+    if not schedule:
+        return set(range(7))
+    days = set()
+    for start, end in re.findall(r"([A-Za-z]{3})[a-z]*\s*(?:-\s*([A-Za-z]{3})[a-z]*)?", schedule):
+        a = DAY_NAMES.get(start.lower())
+        if a is None:
+            continue
+        b = DAY_NAMES.get(end.lower(), a) if end else a
+        days.update(range(a, b + 1) if a <= b else list(range(a, 7)) + list(range(0, b + 1)))
+    return days or set(range(7))
+
+
+@dataclass
+class IndexEntry:
+    doc_id: str
+    kind: str  # "menu", "location" or "truck"
+    text: str
+    snippet: str
+    terms: frozenset
+    payload: Dict[str, Any]
+
+
+def describe(kind: str, doc: Dict[str, Any]) -> Tuple[str, str]:
+    # Returns (indexed text, prompt snippet) for a catalog document
+    if kind == "menu":
+        status = "available" if doc.get("available", True) else "sold out"
+        text = f"{doc.get('name', '')} {doc.get('category', '')} {doc.get('description', '')}"
+        snippet = (
+            f"Menu: {doc.get('name')} (${doc.get('price', 0):.2f}, {doc.get('category')}, {status})"
+            f" - {doc.get('description', '')}"
+        )
+    elif kind == "location":
+        text = f"{doc.get('name', '')} {doc.get('address', '')} {doc.get('schedule') or ''}"
+        snippet = f"Location: {doc.get('name')}, {doc.get('address')} ({doc.get('schedule') or 'schedule varies'})"
+    else:
+        text = f"{doc.get('name', '')} {doc.get('description', '')} {doc.get('phone', '')} {doc.get('email') or ''}"
+        snippet = (
+            f"Truck: {doc.get('name')} - {doc.get('description', '')}. "
+            f"Phone {doc.get('phone')}" + (f", email {doc['email']}" if doc.get("email") else "")
+        )
+    return text, snippet
+
+
+class CatalogIndex:
+    # Hashed bag-of-ngrams vectors in a NumPy matrix; cosine similarity, incremental upserts
+
+    def __init__(self, dim: int = 4096, capacity: int = 256, min_score: float = 0.35):
+        self.dim = dim
+        # Cosine score above which a hit counts as the question naming one of our entries
+        self.min_score = min_score
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries: List[IndexEntry] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            if token in STOPWORDS:
+                continue
+            token = stem(token)
+            features = [token] + [token[i:i + 3] for i in range(max(0, len(token) - 2))]
+            for j, feature in enumerate(features):
+                h = zlib.crc32(feature.encode())
+                # Whole words weigh more than their trigrams; sign bit halves collision bias
+                vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (2.0 if j == 0 else 0.5)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def upsert(self, kind: str, doc_id: str, doc: Dict[str, Any]):
+        text, snippet = describe(kind, doc)
+        entry = IndexEntry(doc_id, kind, text, snippet, frozenset(content_terms(text)), doc)
+        row = self.rows.get(doc_id)
+        if row is None:
+            row = len(self.entries)
+            if row == self.matrix.shape[0]:
+                self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+            self.entries.append(entry)
+            self.rows[doc_id] = row
+        else:
+            self.entries[row] = entry
+        self.matrix[row] = self.vectorize(text)
+
+    def remove(self, doc_id: str):
+        # Swap the last row into the hole so the matrix stays dense
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        last = len(self.entries) - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.entries[row] = self.entries[last]
+            self.rows[self.entries[row].doc_id] = row
+        self.matrix[last] = 0
+        self.entries.pop()
+
+    def search(self, query: str, k: int = 5, kind: Optional[str] = None) -> List[Tuple[float, IndexEntry]]:
+        if not self.entries:
+            return []
+        scores = self.matrix[:len(self.entries)] @ self.vectorize(query)
+        if kind:
+            mask = np.array([entry.kind == kind for entry in self.entries])
+            scores = np.where(mask, scores, -1.0)
+        top = np.argsort(-scores)[:k]
+        return [(float(scores[i]), self.entries[i]) for i in top if scores[i] > 0]
+
+    def context_for(self, query: str, k: int = 5) -> str:
+        # Top-k snippets formatted for the prompt
+        hits = self.search(query, k)
+        if not hits:
+            return ""
+        lines = "\n".join(f"- {entry.snippet}" for _, entry in hits)
+        return f"Relevant food truck data:\n{lines}"
+
+    def about_us(self, query: str, phrasing: re.Pattern, kind: str) -> bool:
+        # Second-person phrasing, the truck's name, or a strong hit on one of our own entries
+        lowered = query.lower()
+        if phrasing.search(lowered):
+            return True
+        truck = next((e for e in self.entries if e.kind == "truck"), None)
+        # "Tasty Wheels" should count for "Tasty Wheels Food Truck"
+        name = re.sub(r"\s+(food\s+)?truck$", "", (truck.payload.get("name") or "").lower()) if truck else ""
+        if name and name in lowered:
+            return True
+        hits = self.search(query, k=1, kind=kind)
+        return bool(hits) and hits[0][0] >= self.min_score
+
+    def answer(self, query: str) -> Optional[str]:
+        # Direct answer for simple lookups; None means the question needs the LLM
+        lowered = query.lower()
+        terms = set(content_terms(query))
+
+        if LOCATION_INTENT.search(lowered) and self.about_us(query, LOCATION_ABOUT_US, "location"):
+            day = next((DAY_NAMES[t] for t in tokenize(lowered) if t in DAY_NAMES), None)
+            locations = [
+                e for e in self.entries
+                if e.kind == "location" and e.payload.get("active", True)
+                and (day is None or day in schedule_days(e.payload.get("schedule")))
+            ]
+            when = f" on {list(DAY_NAMES)[day].capitalize()}" if day is not None else ""
+            if not locations:
+                return f"We don't have any scheduled stops{when} right now."
+            stops = "; ".join(
+                f"{e.payload.get('name')} at {e.payload.get('address')} ({e.payload.get('schedule') or 'hours vary'})"
+                for e in locations
+            )
+            return f"You can find us{when} at: {stops}."
+
+        if CONTACT_INTENT.search(lowered) and self.about_us(query, CONTACT_ABOUT_US, "truck"):
+            truck = next((e for e in self.entries if e.kind == "truck"), None)
+            return truck.snippet if truck else None
+
+        if MENU_INTENT.search(lowered) and terms:
+            # Only answer when an item covers every content word, e.g. not "vegetarian" for fish tacos
+            matches = [
+                entry for _, entry in self.search(query, k=10, kind="menu")
+                if terms <= entry.terms
+            ]
+            if not matches:
+                return None
+            parts = []
+            for entry in matches[:3]:
+                item = entry.payload
+                status = "" if item.get("available", True) else " (sold out right now)"
+                parts.append(f"{item.get('name')} for ${item.get('price', 0):.2f}{status}")
+            prefix = "Yes, we have " if re.search(r"\b(have|sell|serve|got|is there|are there)\b", lowered) else "We have "
+            return prefix + ", ".join(parts) + "."
+
+        return None
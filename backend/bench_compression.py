@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark CPU cost vs bytes saved for catalog response compression
+"""
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime
+
+from compression import brotli, compress
+
+
+def sample_menu(count: int):
+    """Menu payload shaped like GET /api/menu"""
+    categories = ["Burgers", "Tacos", "Sides", "Drinks", "Desserts"]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Item {i}",
+            "description": "Fresh ingredients, house sauce and a bold seasoning blend served hot",
+            "price": 5.99 + i % 10,
+            "category": categories[i % len(categories)],
+            "image_url": f"/api/images/{uuid.uuid4().hex}_medium.webp",
+            "available": i % 7 != 0,
+            "created_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    print("Compression benchmark (per response)")
+    print("=" * 72)
+    print(f"{'items':>6} {'codec':>10} {'bytes':>9} {'ratio':>7} {'compress':>11} {'memo hit':>10}")
+
+    settings = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    if brotli is not None:
+        settings += [("br", 1), ("br", 5), ("br", 11)]
+
+    for count in (10, 100, 1000):
+        body = json.dumps(sample_menu(count), separators=(",", ":")).encode()
+        print(f"{count:>6} {'identity':>10} {len(body):>9} {1.0:>7.2f} {'-':>11} {'-':>10}")
+        cache = {}
+        for encoding, level in settings:
+            repeat = 200 if count < 1000 else 20
+            data = compress(body, encoding, level, level)
+            cost = timed(lambda: compress(body, encoding, level, level), repeat)
+            cache[(encoding, level, hashlib.sha1(body).digest())] = data
+            # What a memoized request pays instead: hash the body and look it up
+            hit = timed(lambda: cache[(encoding, level, hashlib.sha1(body).digest())], repeat)
+            print(
+                f"{count:>6} {f'{encoding}-{level}':>10} {len(data):>9} {len(body) / len(data):>7.2f} "
+                f"{cost * 1e6:>9.0f}us {hit * 1e6:>8.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
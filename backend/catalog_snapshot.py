@@ -0,0 +1,185 @@
+# Catalog snapshot shared across worker processes through a memory-mapped file
+
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Layout: header, then one index entry per section, then the section payloads
+MAGIC = b"FTC1"
+HEADER = struct.Struct("<4sQH")      # magic, version, section count
+ENTRY = struct.Struct("<16sII")      # section name, payload offset, payload length
+
+
+def pack_snapshot(version: int, sections: Dict[str, bytes]) -> bytes:
+    offset = HEADER.size + ENTRY.size * len(sections)
+    index = []
+    for name, payload in sections.items():
+        index.append(ENTRY.pack(name.encode(), offset, len(payload)))
+        offset += len(payload)
+    return HEADER.pack(MAGIC, version, len(sections)) + b"".join(index) + b"".join(sections.values())
+
+
+def unpack_index(buffer) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    magic, version, count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a catalog snapshot")
+    index = {}
+    for i in range(count):
+        name, offset, length = ENTRY.unpack_from(buffer, HEADER.size + i * ENTRY.size)
+        index[name.rstrip(b"\0").decode()] = (offset, length)
+    return version, index
+
+
+class SnapshotResponse(Response):
+    # Sends a memoryview of the mapping as-is instead of copying it into bytes
+
+    def render(self, content) -> memoryview:
+        return content
+
+
+class CatalogSnapshot:
+    # Read side: maps the snapshot file and hands out zero-copy section views
+
+    def __init__(self, path: Path, check_interval: float = 0.05):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.version = 0
+        self._map: Optional[mmap.mmap] = None
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._identity: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+
+    def _refresh_mapping(self):
+        # Publishing replaces the file, so a new inode means a new version
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._identity:
+            return
+        with open(self.path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            version, index = unpack_index(mapping)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable catalog snapshot: {e}")
+            mapping.close()
+            return
+        # Old mapping stays alive while in-flight responses still reference it
+        self._map, self._index, self.version, self._identity = mapping, index, version, identity
+
+    def section(self, name: str) -> Optional[memoryview]:
+        self._refresh_mapping()
+        if self._map is None or name not in self._index:
+            return None
+        offset, length = self._index[name]
+        return memoryview(self._map)[offset:offset + length]
+
+
+class SnapshotPublisher:
+    # Write side: one elected leader refreshes periodically; any worker republishes after its own writes
+
+    def __init__(
+        self,
+        path: Path,
+        build: Callable[[], Awaitable[Dict[str, bytes]]],
+        refresh_seconds: float = 30.0,
+        debounce_seconds: float = 0.2,
+    ):
+        self.path = Path(path)
+        self.build = build
+        self.refresh_seconds = refresh_seconds
+        self.debounce_seconds = debounce_seconds
+        self.is_leader = False
+        self._leader_file = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def _try_lead(self) -> bool:
+        # Leadership is an exclusive flock held for the life of the process
+        if self.is_leader:
+            return True
+        handle = open(str(self.path) + ".leader", "a+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._leader_file = handle
+        self.is_leader = True
+        logger.info(f"Worker {os.getpid()} is catalog snapshot leader")
+        return True
+
+    def _write(self, sections: Dict[str, bytes]) -> int:
+        # Serialize writers so version numbers never go backwards
+        with open(str(self.path) + ".lock", "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            version = 0
+            try:
+                with open(self.path, "rb") as f:
+                    magic, current, _ = HEADER.unpack(f.read(HEADER.size))
+                if magic == MAGIC:
+                    version = current
+            except (FileNotFoundError, struct.error):
+                pass
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(pack_snapshot(version + 1, sections))
+            os.replace(tmp, self.path)
+            return version + 1
+
+    async def publish(self):
+        try:
+            sections = await self.build()
+            version = await asyncio.to_thread(self._write, sections)
+            logger.info(f"Published catalog snapshot v{version}")
+        except Exception as e:
+            logger.error(f"Failed to publish catalog snapshot: {e}")
+
+    def mark_dirty(self):
+        # Coalesce bursts of writes into a single republish
+        self._dirty = True
+        if self._pending and not self._pending.done():
+            return
+        self._pending = asyncio.create_task(self._publish_later())
+
+    async def _publish_later(self):
+        # Loop so writes landing mid-build still get published
+        while self._dirty:
+            await asyncio.sleep(self.debounce_seconds)
+            self._dirty = False
+            await self.publish()
+
+    async def _run(self):
+        while True:
+            if self._try_lead():
+                await self.publish()
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._pending):
+            if task:
+                task.cancel()
+        if self._leader_file:
+            self._leader_file.close()
+            self._leader_file = None
+            self.is_leader = False
@@ -0,0 +1,328 @@
+# Mongo command monitoring: latency histograms per collection/operation and a slow-query log with plans
+
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; anything slower lands in the overflow bucket
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Commands the server can explain, and where each keeps its filter
+EXPLAINABLE = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Driver-added fields that explain rejects or that belong to the original session
+SESSION_FIELDS = {"lsid", "$clusterTime", "$db", "txnNumber", "$readPreference", "readConcern", "writeConcern", "cursor"}
+
+
+def _field_shape(doc: Any) -> List[str]:
+    # {"id": "x", "updated_at": {"$gt": t}} -> ["id", "updated_at:$gt"]; values are never kept
+    if not isinstance(doc, dict):
+        return []
+    shape = []
+    for key, value in doc.items():
+        if isinstance(value, dict) and value and all(k.startswith("$") for k in value):
+            shape.append(f"{key}:{','.join(sorted(value))}")
+        elif key in ("$and", "$or", "$nor") and isinstance(value, list):
+            shape.append(f"{key}({'|'.join(' '.join(_field_shape(v)) for v in value)})")
+        else:
+            shape.append(key)
+    return sorted(shape)
+
+
+def query_shape(name: str, command: Dict[str, Any]) -> str:
+    # Groups slow queries that differ only in literal values
+    field = EXPLAINABLE.get(name)
+    if field == "pipeline":
+        stages = command.get("pipeline") or []
+        parts = []
+        for stage in stages:
+            op = next(iter(stage), "?")
+            parts.append(f"{op}{{{','.join(_field_shape(stage[op]))}}}" if op == "$match" else op)
+        return " ".join(parts)
+    if field in ("updates", "deletes"):
+        statements = command.get(field) or [{}]
+        shape = f"{{{','.join(_field_shape(statements[0].get('q')))}}}"
+    else:
+        shape = f"{{{','.join(_field_shape(command.get(field)))}}}"
+    if command.get("sort"):
+        shape += f" sort{{{','.join(command['sort'])}}}"
+    return shape
+
+
+def explain_target(name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    # The original command minus session plumbing; write batches are cut to their first statement
+    target = {k: v for k, v in command.items() if k not in SESSION_FIELDS}
+    if name in ("update", "delete"):
+        field = EXPLAINABLE[name]
+        target[field] = list(target.get(field) or [])[:1]
+    if name == "aggregate":
+        # $out/$merge stages can't be explained without running them
+        target["pipeline"] = [s for s in target.get("pipeline") or [] if "$out" not in s and "$merge" not in s]
+        target["cursor"] = {}
+    return target
+
+
+def _find_winning_plan(explain: Any) -> Optional[Dict[str, Any]]:
+    # find/update put queryPlanner at the top; aggregate nests it under a $cursor stage
+    if isinstance(explain, dict):
+        planner = explain.get("queryPlanner")
+        if isinstance(planner, dict) and "winningPlan" in planner:
+            return planner["winningPlan"]
+        children = explain.values()
+    elif isinstance(explain, list):
+        children = explain
+    else:
+        return None
+    for child in children:
+        found = _find_winning_plan(child)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    plan = _find_winning_plan(explain)
+    stages, indexes = [], []
+    pending = [plan] if plan else []
+    while pending:
+        node = pending.pop()
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        pending.extend(node.get("inputStages") or [])
+        if node.get("inputStage"):
+            pending.append(node["inputStage"])
+        # Slot-based engine wraps the classic tree
+        if isinstance(node.get("queryPlan"), dict):
+            pending.append(node["queryPlan"])
+    return {"stages": stages, "indexes": indexes, "collscan": "COLLSCAN" in stages}
+
+
+class _Histogram:
+    __slots__ = ("count", "failures", "total_us", "max_us", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, micros: int, failed: bool):
+        self.count += 1
+        self.failures += failed
+        self.total_us += micros
+        self.max_us = max(self.max_us, micros)
+        ms = micros / 1000
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, p: float) -> float:
+        # Upper bound of the bucket holding the p-th sample; the overflow bucket reports max
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else round(self.max_us / 1000, 3)
+        return 0.0
+
+    def view(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "total_ms": round(self.total_us / 1000, 3),
+            "mean_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_us / 1000, 3),
+            "buckets": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    # Driver callbacks run on Motor's executor threads; explains are handed back to the event loop
+
+    def __init__(self, slow_ms: float = 100, log_size: int = 200, explain: bool = True, plan_cache_size: int = 256):
+        self.slow_us = slow_ms * 1000
+        self.explain = explain
+        self.plan_cache_size = plan_cache_size
+        self.histograms: Dict[Tuple[str, str], _Histogram] = {}
+        self.slow_queries: deque = deque(maxlen=log_size)
+        # (collection, command, shape) -> plan summary, so each shape is explained once
+        self.plans: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._started: Dict[Tuple[int, Any], Tuple[str, str, Dict[str, Any], Optional[int]]] = {}
+        # Open tailable cursors, e.g. the change feed; their getMores wait for data by design
+        self._tailable_cursors: set = set()
+        self._lock = threading.Lock()
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explaining: set = set()
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop):
+        # The client is created with this listener, so it can only be wired up afterwards
+        self._client = client
+        self._loop = loop
+
+    def started(self, event):
+        # getMore carries the cursor id in its first field and names the collection separately
+        field = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(field)
+        if not isinstance(collection, str):
+            # ping, hello, endSessions, explain, ...: not collection operations
+            return
+        command = dict(event.command) if event.command_name in EXPLAINABLE else {}
+        # Cursor id for getMores on tailable cursors, 0 for the find that opens one, else None
+        tailable = None
+        if event.command_name == "find" and event.command.get("tailable"):
+            tailable = 0
+        elif event.command_name == "getMore" and event.command["getMore"] in self._tailable_cursors:
+            tailable = event.command["getMore"]
+        with self._lock:
+            self._started[(event.request_id, event.connection_id)] = (collection, event.database_name, command, tailable)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        name = event.command_name
+        with self._lock:
+            started = self._started.pop((event.request_id, event.connection_id), None)
+            if started is None:
+                return
+            collection, database, command, tailable = started
+            if tailable is not None:
+                reply = getattr(event, "reply", None) or {}
+                cursor_id = 0 if failed else reply.get("cursor", {}).get("id", 0)
+                if cursor_id:
+                    self._tailable_cursors.add(cursor_id)
+                else:
+                    self._tailable_cursors.discard(tailable)
+                if name == "getMore":
+                    # Awaiting getMores block server-side until data arrives; that wait isn't query cost
+                    return
+            key = (collection, name)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram()
+            histogram.add(event.duration_micros, failed)
+
+        if event.duration_micros >= self.slow_us:
+            self._record_slow(collection, database, name, command, event.duration_micros, failed)
+
+    def _record_slow(self, collection: str, database: str, name: str, command: Dict[str, Any], micros: int, failed: bool):
+        shape = query_shape(name, command) if command else ""
+        plan_key = (collection, name, shape)
+        entry = {
+            "at": datetime.utcnow().isoformat() + "Z",
+            "collection": collection,
+            "command": name,
+            "shape": shape,
+            "duration_ms": round(micros / 1000, 3),
+            "failed": failed,
+            "plan": self.plans.get(plan_key),
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            f"Slow Mongo {name} on {collection}: {entry['duration_ms']}ms {shape}",
+            extra={"mongo_collection": collection, "mongo_command": name, "duration_ms": entry["duration_ms"]},
+        )
+        if (
+            self.explain and command and entry["plan"] is None
+            and self._client is not None and self._loop is not None and not self._loop.is_closed()
+        ):
+            target = explain_target(name, command)
+            self._loop.call_soon_threadsafe(self._schedule_explain, plan_key, database, target, entry)
+
+    def _schedule_explain(self, plan_key, database: str, target: Dict[str, Any], entry: Dict[str, Any]):
+        # On the event loop; one explain per shape in flight
+        if plan_key in self._explaining:
+            return
+        self._explaining.add(plan_key)
+        asyncio.ensure_future(self._explain(plan_key, database, target, entry))
+
+    async def _explain(self, plan_key, database: str, target: Dict[str, Any], entry: Dict[str, Any]):
+        try:
+            # queryPlanner only: picks the plan without executing the query again
+            result = await self._client[database].command({"explain": target, "verbosity": "queryPlanner"})
+            plan = summarize_plan(result)
+        except Exception as e:
+            plan = {"error": str(e)}
+        finally:
+            self._explaining.discard(plan_key)
+        entry["plan"] = plan
+        self.plans[plan_key] = plan
+        while len(self.plans) > self.plan_cache_size:
+            self.plans.popitem(last=False)
+        if plan.get("collscan"):
+            logger.warning(f"Collection scan on {plan_key[0]} for {plan_key[1]} {plan_key[2]}")
+
+    def stats(self, limit: int = 20) -> List[Dict[str, Any]]:
+        # Heaviest (collection, command) pairs by total time spent
+        with self._lock:
+            rows = [
+                {"collection": collection, "command": name, **histogram.view()}
+                for (collection, name), histogram in self.histograms.items()
+            ]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows[:limit]
+
+    def top_slow(self, limit: int = 20) -> List[Dict[str, Any]]:
+        # Slow log grouped by query shape, worst offenders first
+        offenders: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for entry in list(self.slow_queries):
+            key = (entry["collection"], entry["command"], entry["shape"])
+            row = offenders.get(key)
+            if row is None:
+                row = offenders[key] = {
+                    "collection": entry["collection"],
+                    "command": entry["command"],
+                    "shape": entry["shape"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            row["count"] += 1
+            row["total_ms"] = round(row["total_ms"] + entry["duration_ms"], 3)
+            row["max_ms"] = max(row["max_ms"], entry["duration_ms"])
+            row["last_seen"] = entry["at"]
+            row["plan"] = entry["plan"] or self.plans.get(key)
+        rows = sorted(offenders.values(), key=lambda row: row["total_ms"], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+        self.slow_queries.clear()
+        self.plans.clear()
+
+
+def create_command_monitor() -> CommandMonitor:
+    return CommandMonitor(
+        slow_ms=float(os.getenv("MONGO_SLOW_QUERY_MS", "100")),
+        log_size=int(os.getenv("MONGO_SLOW_QUERY_LOG_SIZE", "200")),
+        explain=os.getenv("MONGO_EXPLAIN_SLOW_QUERIES", "true").lower() == "true",
+    )
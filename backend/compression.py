@@ -0,0 +1,199 @@
+# Negotiated gzip/brotli response compression with a memo of compressed catalog bodies
+
+import gzip
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional: falls back to gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "+json", "+xml")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    # "br;q=1.0, gzip;q=0.8, *;q=0" -> {"br": 1.0, "gzip": 0.8, "*": 0.0}
+    weights = {}
+    for part in header.split(","):
+        piece = part.strip()
+        if not piece:
+            continue
+        name, _, params = piece.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    return weights
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    # Prefer brotli on ties: smaller output for the same JSON
+    for encoding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    # Each content-coding is its own representation: "abc" -> "abc-gzip", W/"abc" -> W/"abc-gzip"
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + b"-" + encoding.encode() + b'"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    # Weak comparison against the identity tag or any encoded variant; returns the tag that matched
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    base = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        opaque = candidate.removeprefix("W/")
+        if opaque == base or opaque in (encoded_etag(base.encode(), e).decode() for e in ("gzip", "br")):
+            return candidate
+    return None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int, brotli_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(bytes(body), quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class StreamCompressor:
+    # Incremental encoder for chunked responses; flushes each chunk so streams stay live
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(bytes(data))
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    # Pure ASGI: buffers only the first body chunk to decide, memoizes cacheable bodies
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache_paths: Iterable[str] = (),
+        cache_entries: int = 64,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_paths = frozenset(cache_paths)
+        self.cache_entries = cache_entries
+        self.cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _memo_key(self, scope, encoding: str, headers: Dict[bytes, bytes], body: bytes) -> Optional[Tuple]:
+        # Same content version + same encoding = same compressed bytes
+        if scope["method"] != "GET" or scope["path"] not in self.cache_paths:
+            return None
+        version = headers.get(b"etag") or hashlib.sha1(body).digest()
+        return scope["path"], encoding, version
+
+    def _compressed(self, key: Optional[Tuple], body: bytes, encoding: str) -> bytes:
+        if key is not None and key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        data = compress(body, encoding, self.gzip_level, self.brotli_quality)
+        if key is not None:
+            self.misses += 1
+            self.cache[key] = data
+            if len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return data
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        streamer: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, streamer, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if streamer is not None:
+                return await send({"type": "http.response.body", "body": streamer.chunk(body, not more_body), "more_body": more_body})
+
+            # First body chunk: decide once for the whole response
+            headers = dict(start_message.get("headers", []))
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            eligible = (
+                b"content-encoding" not in headers
+                and any(t in content_type for t in COMPRESSIBLE_TYPES)
+                and (more_body or len(body) >= self.minimum_size)
+            )
+            if not eligible:
+                passthrough = True
+                await send(start_message)
+                return await send(message)
+
+            new_headers = [
+                (k, v) for k, v in start_message.get("headers", [])
+                if k not in (b"content-length", b"vary", b"etag")
+            ]
+            if b"etag" in headers:
+                new_headers.append((b"etag", encoded_etag(headers[b"etag"], encoding)))
+            vary = headers.get(b"vary")
+            new_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+            new_headers.append((b"content-encoding", encoding.encode()))
+
+            if more_body:
+                # Streaming: unknown length, compress chunk by chunk
+                streamer = StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+                await send({**start_message, "headers": new_headers})
+                return await send({"type": "http.response.body", "body": streamer.chunk(body, False), "more_body": True})
+
+            data = self._compressed(self._memo_key(scope, encoding, headers, body), body, encoding)
+            new_headers.append((b"content-length", str(len(data)).encode()))
+            await send({**start_message, "headers": new_headers})
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, send_compressed)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.cache), "hits": self.hits, "misses": self.misses}
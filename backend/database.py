@@ -0,0 +1,207 @@
+# MongoDB client setup, pool monitoring and catalog circuit breaker
+
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import ReadPreference
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Env var -> (client option, default); keeps requests from hanging when Mongo is unhealthy
+CLIENT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", 100),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", 0),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", 60000),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", 5000),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", 5000),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", 10000),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", 2000),
+}
+
+
+def read_preference(name: Optional[str]):
+    if not name:
+        return ReadPreference.PRIMARY
+    try:
+        return READ_PREFERENCES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown read preference: {name}")
+
+
+def mongo_client_options() -> Dict[str, Any]:
+    options = {option: int(os.getenv(env, default)) for env, (option, default) in CLIENT_OPTIONS.items()}
+    options["read_preference"] = read_preference(os.getenv("MONGO_READ_PREFERENCE"))
+    return options
+
+
+def create_mongo_client(mongo_url: str, listeners: Optional[List[Any]] = None) -> AsyncIOMotorClient:
+    options = mongo_client_options()
+    logger.info(
+        f"Mongo pool max={options['maxPoolSize']} "
+        f"selection_timeout={options['serverSelectionTimeoutMS']}ms "
+        f"socket_timeout={options['socketTimeoutMS']}ms"
+    )
+    return AsyncIOMotorClient(mongo_url, event_listeners=listeners or [], **options)
+
+
+def catalog_database(client: AsyncIOMotorClient, name: str):
+    # Catalog reads may go to secondaries; writes and sync stay on the default db
+    return client.get_database(name, read_preference=read_preference(os.getenv("MONGO_CATALOG_READ_PREFERENCE")))
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    # Tracks connection pool usage per server for readiness checks
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self.checked_out: Dict[str, int] = {}
+        self.waiting: Dict[str, int] = {}
+        self.checkout_failures = 0
+
+    def _key(self, event) -> str:
+        return "%s:%s" % event.address
+
+    def _bump(self, counts: Dict[str, int], event, delta: int):
+        key = self._key(event)
+        counts[key] = max(0, counts.get(key, 0) + delta)
+
+    def connection_check_out_started(self, event):
+        self._bump(self.waiting, event, 1)
+
+    def connection_checked_out(self, event):
+        self._bump(self.waiting, event, -1)
+        self._bump(self.checked_out, event, 1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(self.waiting, event, -1)
+        self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        self._bump(self.checked_out, event, -1)
+
+    def pool_cleared(self, event):
+        self.checked_out.pop(self._key(event), None)
+
+    def pool_closed(self, event):
+        self.checked_out.pop(self._key(event), None)
+        self.waiting.pop(self._key(event), None)
+
+    # Remaining events aren't needed for saturation stats
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        servers = {}
+        for address in set(self.checked_out) | set(self.waiting):
+            in_use = self.checked_out.get(address, 0)
+            servers[address] = {
+                "in_use": in_use,
+                "waiting": self.waiting.get(address, 0),
+                "saturation": round(in_use / self.max_pool_size, 3) if self.max_pool_size else 0,
+            }
+        return {
+            "max_pool_size": self.max_pool_size,
+            "checkout_failures": self.checkout_failures,
+            "servers": servers,
+        }
+
+    def saturated(self) -> bool:
+        return any(
+            self.checked_out.get(address, 0) >= self.max_pool_size and waiting > 0
+            for address, waiting in self.waiting.items()
+        )
+
+
+class CircuitOpenError(Exception):
+    # Raised when Mongo is unavailable and there is no cached result to serve
+    pass
+
+
+class CircuitBreaker:
+    # Fails fast after repeated Mongo errors, serving the last good result per key
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Half-open lets a single trial through; everyone else keeps getting the fallback
+        self._probing = False
+        self._cache: Dict[Hashable, Any] = {}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def _fallback(self, key: Hashable, error: Exception):
+        if key in self._cache:
+            return self._cache[key]
+        raise CircuitOpenError(str(error))
+
+    async def call(self, key: Hashable, func: Callable[[], Awaitable[Any]]):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            return self._fallback(key, Exception("Database circuit open"))
+
+        # Closed, or half-open letting the trial request through
+        trial = state == "half_open"
+        if trial:
+            self._probing = True
+        try:
+            result = await func()
+        except PyMongoError as e:
+            self.failures += 1
+            if trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"Database circuit opened after {self.failures} failures: {e}")
+                self.opened_at = time.monotonic()
+            return self._fallback(key, e)
+        finally:
+            if trial:
+                self._probing = False
+
+        if self.opened_at is not None:
+            logger.info("Database circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._cache[key] = result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "cached_keys": len(self._cache)}
+
+
+def create_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("MONGO_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("MONGO_BREAKER_RESET_SECONDS", "30")),
+    )
@@ -0,0 +1,111 @@
+# Idempotency-Key support for create routes: replay stored responses instead of writing twice
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    # Maps to an HTTP error: 409 while the original is in flight, 422 on key reuse
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def fingerprint(payload: Any) -> str:
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    # Keys live in Mongo with a TTL; a unique _id makes the first request win the claim
+
+    def __init__(self, collection, ttl: timedelta, lock_timeout: timedelta, wait_seconds: float):
+        self.collection = collection
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait_seconds = wait_seconds
+
+    async def setup(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def _claim(self, doc_id: str, digest: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.collection.insert_one({
+                "_id": doc_id,
+                "fingerprint": digest,
+                "status": "processing",
+                "created_at": now,
+                "expires_at": now + self.ttl,
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+        # Take over a claim whose owner crashed before finishing
+        stale = await self.collection.find_one_and_update(
+            {"_id": doc_id, "status": "processing", "fingerprint": digest, "created_at": {"$lt": now - self.lock_timeout}},
+            {"$set": {"created_at": now, "expires_at": now + self.ttl}},
+        )
+        return stale is not None
+
+    async def _wait_for_result(self, doc_id: str, digest: str) -> Any:
+        deadline = asyncio.get_running_loop().time() + self.wait_seconds
+        while True:
+            existing = await self.collection.find_one({"_id": doc_id})
+            if existing is None:
+                raise IdempotencyConflict(409, "Original request failed; retry with the same key")
+            if existing["fingerprint"] != digest:
+                raise IdempotencyConflict(422, "Idempotency-Key was already used with a different request")
+            if existing["status"] == "completed":
+                return existing["response"]
+            if asyncio.get_running_loop().time() >= deadline:
+                raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(0.1)
+
+    async def run(
+        self, scope: str, client: str, key: str, payload: Any, handler: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        # Returns (response, replayed); keys are per client, so two devices can't replay each other's writes
+        if len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyConflict(400, f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+        doc_id = f"{scope}:{hashlib.sha256(client.encode()).hexdigest()[:16]}:{key}"
+        digest = fingerprint(payload)
+
+        if not await self._claim(doc_id, digest):
+            return await self._wait_for_result(doc_id, digest), True
+
+        try:
+            result = await handler()
+        except BaseException:
+            # Release the key so the client's retry can do the work
+            await self.collection.delete_one({"_id": doc_id, "status": "processing"})
+            raise
+
+        stored = jsonable_encoder(result)
+        await self.collection.update_one(
+            {"_id": doc_id},
+            {"$set": {"status": "completed", "response": stored, "completed_at": datetime.utcnow()}}
+        )
+        return result, False
+
+
+def create_idempotency_store(db) -> IdempotencyStore:
+    return IdempotencyStore(
+        db.idempotency_keys,
+        ttl=timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))),
+        lock_timeout=timedelta(seconds=float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))),
+        wait_seconds=float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5")),
+    )
@@ -0,0 +1,198 @@
+# Image ingestion: resized variants, content-hash keys, pluggable blob storage
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels
+VARIANT_SIZES = {"thumb": 200, "medium": 800}
+
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
+# Pillow format -> extension the original is stored under; other formats are rejected
+SOURCE_FORMATS = {"jpeg": "jpg", "png": "png", "webp": "webp", "gif": "gif"}
+
+# <source sha256 prefix>_<variant>.<ext>; anything else is rejected before touching storage
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}_[a-z0-9]+\.(jpg|png|webp|gif)$")
+
+
+def content_type_for(key: str) -> str:
+    return CONTENT_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "jpg":
+        image.convert("RGB").save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+    elif fmt == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "WEBP", quality=80, method=4)
+    return buffer.getvalue()
+
+
+def render_variants(data: bytes, digest: str, max_pixels: int) -> Dict[str, bytes]:
+    # CPU-bound; runs in the worker pool, never on the event loop
+    with Image.open(io.BytesIO(data)) as source:
+        # Header only so far: reject oversized images before decoding a single pixel
+        if source.width * source.height > max_pixels:
+            raise ValueError(f"Image is {source.width}x{source.height}; limit is {max_pixels} pixels")
+        source_format = (source.format or "").lower()
+        if source_format not in SOURCE_FORMATS:
+            # Stored originals are served by extension, so a TIFF or BMP can't pass as PNG
+            raise ValueError(f"Unsupported image format: {source.format or 'unknown'}")
+        has_alpha = source.mode in ("RGBA", "LA", "PA") or "transparency" in source.info
+        # thumbnail() decodes JPEGs at reduced scale via draft() and bins others with reduce()
+        largest = max(VARIANT_SIZES.values())
+        source.thumbnail((largest, largest), Image.LANCZOS, reducing_gap=2.0)
+        # Phone photos are stored sideways with an EXIF rotation; the bounding box is square, so
+        # turning the reduced image gives the same pixels as turning the full one
+        upright = ImageOps.exif_transpose(source)
+        image = upright.convert("RGBA" if has_alpha else "RGB")
+
+    original_ext = SOURCE_FORMATS[source_format]
+    fallback_ext = "png" if has_alpha else "jpg"
+
+    blobs = {f"{digest}_original.{original_ext}": data}
+    for name, edge in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        blobs[f"{digest}_{name}.{fallback_ext}"] = _encode(resized, fallback_ext)
+        blobs[f"{digest}_{name}.webp"] = _encode(resized, "webp")
+    return blobs
+
+
+class BlobStore:
+    # Storage backend for image blobs
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        # Stores backed by the local filesystem can be served with sendfile
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    # Files on local disk under a single directory
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    async def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._write, key, data)
+
+    def _write(self, key: str, data: bytes):
+        # Write-then-rename so readers never see a partial file
+        target = self.root / key
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        path = self.local_path(key)
+        return await asyncio.to_thread(path.read_bytes) if path else None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        path = self.root / key
+        return path if path.is_file() else None
+
+
+class ImagePipeline:
+    # Validates uploads, renders variants in a process pool and stores them
+
+    def __init__(self, store: BlobStore, url_prefix: str, max_bytes: int, workers: int, max_pixels: int = 25_000_000):
+        self.store = store
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Lazy so workers that never see an upload don't start a pool; forkserver because forking
+        # this process would copy the log listener and Motor threads mid-flight
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def _describe(self, digest: str, keys) -> Dict[str, object]:
+        variants = {}
+        original = None
+        for key in keys:
+            name = key[len(digest) + 1:]
+            if name.startswith("original."):
+                original = self.url_for(key)
+            else:
+                variants[name.replace(".", "_")] = self.url_for(key)
+        return {"id": digest, "url": original, "variants": variants}
+
+    async def ingest(self, data: bytes) -> Dict[str, object]:
+        if not data:
+            raise ValueError("Empty upload")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"Image exceeds {self.max_bytes} bytes")
+
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        loop = asyncio.get_running_loop()
+        try:
+            blobs = await loop.run_in_executor(self.executor, render_variants, data, digest, self.max_pixels)
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"Image too large: {e}")
+        except (UnidentifiedImageError, OSError) as e:
+            raise ValueError(f"Unsupported image: {e}")
+
+        # Same bytes hash to the same keys, so re-uploads skip the writes
+        for key, blob in blobs.items():
+            if not await self.store.exists(key):
+                await self.store.put(key, blob, content_type_for(key))
+        logger.info(f"Stored image {digest} with {len(blobs)} variants")
+        return self._describe(digest, blobs.keys())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_image_pipeline(root_dir: Path) -> ImagePipeline:
+    store = LocalBlobStore(Path(os.getenv("IMAGE_STORAGE_DIR", str(root_dir / "uploads" / "images"))))
+    return ImagePipeline(
+        store,
+        url_prefix=os.getenv("IMAGE_URL_PREFIX", "/api/images"),
+        max_bytes=int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024))),
+        max_pixels=int(os.getenv("IMAGE_MAX_PIXELS", str(25_000_000))),
+        workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    )
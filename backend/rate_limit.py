@@ -0,0 +1,265 @@
+# Per-client token-bucket rate limiting as ASGI middleware
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Budget:
+    # capacity tokens, refilled evenly over period seconds
+    name: str
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "Budget":
+        # "30/60" -> 30 requests per 60 seconds
+        capacity, period = spec.split("/")
+        return cls(name, int(capacity), float(period))
+
+
+# (allowed, tokens remaining, seconds until a token is available)
+Decision = Tuple[bool, int, float]
+
+
+class RateLimitBackend:
+    async def take(self, key: str, budget: Budget, cost: int = 1) -> Decision:
+        raise NotImplementedError
+
+
+class InMemoryBackend(RateLimitBackend):
+    # Per-process buckets; LRU-bounded so one-off clients don't grow memory forever
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, budget: Budget, cost: int = 1) -> Decision:
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (float(budget.capacity), now))
+        tokens = min(budget.capacity, tokens + (now - updated) * budget.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return allowed, int(tokens), max(0.0, (cost - tokens) / budget.rate)
+
+
+class MongoBackend(RateLimitBackend):
+    # Shared buckets across workers; one atomic pipeline update per request
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def setup(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, budget: Budget, cost: int = 1) -> Decision:
+        now = datetime.utcnow()
+        refilled = {"$min": [budget.capacity, {"$add": [
+            {"$ifNull": ["$tokens", budget.capacity]},
+            {"$multiply": [
+                {"$divide": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, 1000]},
+                budget.rate,
+            ]},
+        ]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{budget.name}:{key}"},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    "expires_at": now + timedelta(seconds=budget.period * 2),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        tokens = doc["tokens"]
+        return doc["allowed"], int(tokens), max(0.0, (cost - tokens) / budget.rate)
+
+
+class ClientIdentity:
+    # Who a request comes from, built only from facts the server can verify
+
+    def __init__(self, trusted_proxies: Iterable[str] = (), api_keys: Iterable[str] = ()):
+        self.trusted_proxies = [ipaddress.ip_network(p.strip(), strict=False) for p in trusted_proxies if p.strip()]
+        self.api_keys = [k.strip() for k in api_keys if k.strip()]
+        self._warned_forwarding = False
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def peer_ip(self, scope) -> str:
+        client = scope.get("client")
+        peer = client[0] if client else "unknown"
+        forwarded = dict(scope.get("headers") or []).get(b"x-forwarded-for", b"").decode("latin-1")
+        if not self._trusted(peer):
+            if forwarded and not self._warned_forwarding:
+                # Likely deployed behind a proxy that isn't listed: every caller would share its bucket
+                logger.warning(
+                    f"X-Forwarded-For received from untrusted peer {peer}; "
+                    f"set TRUSTED_PROXIES or all clients behind it share one rate limit"
+                )
+                self._warned_forwarding = True
+            return peer
+        # Walk X-Forwarded-For from the right; the first hop not run by us is the client
+        for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+            if not self._trusted(hop):
+                return hop
+            peer = hop
+        return peer
+
+    def _api_key(self, scope) -> Optional[str]:
+        # Only keys from the configured set identify a client; anything else is ignored
+        presented = dict(scope.get("headers") or []).get(b"x-api-key")
+        if not presented:
+            return None
+        for key in self.api_keys:
+            if hmac.compare_digest(presented, key.encode()):
+                return hashlib.sha256(key.encode()).hexdigest()[:16]
+        return None
+
+    def _client_name(self, scope) -> Optional[str]:
+        client_name = dict(scope.get("headers") or []).get(b"x-client-name")
+        return client_name.decode("latin-1")[:128] if client_name else None
+
+    def __call__(self, scope) -> str:
+        # Rate limit key; X-Client-Name is self-reported, so it never replaces the verified identity
+        key = self._api_key(scope)
+        return f"key:{key}" if key else f"ip:{self.peer_ip(scope)}"
+
+    def stable_id(self, scope) -> str:
+        # For state that must survive a network change (e.g. idempotency keys): never the IP,
+        # which moves on a Wi-Fi/cellular switch and is shared by everyone behind an untrusted proxy
+        key = self._api_key(scope)
+        identity = f"key:{key}" if key else "anonymous"
+        client_name = self._client_name(scope)
+        if client_name:
+            identity += "|client:" + client_name
+        return identity
+
+
+def create_client_identity() -> ClientIdentity:
+    # TRUSTED_PROXIES: CIDRs whose X-Forwarded-For is believed; CLIENT_API_KEYS: known per-client keys
+    return ClientIdentity(
+        trusted_proxies=os.getenv("TRUSTED_PROXIES", "").split(","),
+        api_keys=os.getenv("CLIENT_API_KEYS", "").split(","),
+    )
+
+
+@dataclass
+class Rule:
+    # First matching rule picks the budget; methods None matches any method
+    prefix: str
+    budget: Optional[Budget]
+    methods: Optional[frozenset] = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return path.startswith(self.prefix) and (self.methods is None or method in self.methods)
+
+
+class RateLimitMiddleware:
+    # Pure ASGI so the hot path is one dict lookup and a header append
+
+    def __init__(self, app, backend: RateLimitBackend, rules: List[Rule], identity: Optional[ClientIdentity] = None):
+        self.app = app
+        self.backend = backend
+        self.rules = rules
+        self.identity = identity or ClientIdentity()
+
+    def _budget(self, method: str, path: str) -> Optional[Budget]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule.budget
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        budget = self._budget(scope["method"], scope["path"])
+        if budget is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            allowed, remaining, retry_after = await self.backend.take(self.identity(scope), budget)
+        except Exception as e:
+            # Fail open: a limiter outage shouldn't take the API down with it
+            logger.error(f"Rate limiter unavailable: {e}")
+            return await self.app(scope, receive, send)
+
+        limit_headers = [
+            (b"ratelimit-limit", str(budget.capacity).encode()),
+            (b"ratelimit-remaining", str(remaining).encode()),
+            (b"ratelimit-reset", str(math.ceil(retry_after)).encode()),
+            (b"ratelimit-policy", f"{budget.capacity};w={int(budget.period)}".encode()),
+        ]
+
+        if not allowed:
+            body = json.dumps({"detail": "Rate limit exceeded", "budget": budget.name}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": limit_headers + [
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + limit_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def default_rules() -> List[Rule]:
+    # Expensive AI routes, writes and catalog reads get separate budgets
+    ai = Budget.parse("ai", os.getenv("RATE_LIMIT_AI", "10/60"))
+    write = Budget.parse("write", os.getenv("RATE_LIMIT_WRITE", "60/60"))
+    read = Budget.parse("read", os.getenv("RATE_LIMIT_READ", "600/60"))
+    return [
+        Rule("/api/health", None),
+        # Polling job results is cheap; only submitting one spends the AI budget
+        Rule("/api/search/jobs", read, frozenset({"GET"})),
+        Rule("/api/chat", ai),
+        Rule("/api/search", ai),
+        Rule("/api/", write, frozenset({"POST", "PUT", "PATCH", "DELETE"})),
+        Rule("/api/", read),
+    ]
+
+
+def create_rate_limit_backend(db) -> RateLimitBackend:
+    # RATE_LIMIT_BACKEND: "memory" (default, per worker) or "mongo" (shared)
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "mongo":
+        return MongoBackend(db.rate_limits)
+    return InMemoryBackend()
@@ -0,0 +1,194 @@
+# Live change feed for catalog collections with pluggable pub/sub
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Collections clients can subscribe to
+FEED_TOPICS = ("menu_items", "locations", "food_truck_info")
+
+
+def _json_default(value: Any):
+    # Datetimes go out as ISO strings
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    return json.dumps(message, default=_json_default, separators=(",", ":"))
+
+
+def diff_fields(before: Optional[dict], after: dict) -> dict:
+    # Only the fields that changed, so updates stay small on the wire
+    if not before:
+        return {k: v for k, v in after.items() if k != "_id"}
+    return {k: v for k, v in after.items() if k != "_id" and before.get(k) != v}
+
+
+class PubSubBackend:
+    # Transport between workers; deliver() is called once per message per worker
+
+    async def start(self, deliver: Callable[[Dict[str, Any]], None]):
+        raise NotImplementedError
+
+    async def publish(self, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InProcessPubSub(PubSubBackend):
+    # Single-worker default: publish delivers straight to local subscribers
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, message):
+        if self._deliver:
+            self._deliver(message)
+
+
+class MongoPubSub(PubSubBackend):
+    # Multi-worker backend: capped collection tailed by every worker
+
+    def __init__(self, db, collection_name: str = "change_feed", size_bytes: int = 4 * 1024 * 1024):
+        self.db = db
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver):
+        try:
+            await self.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # Already exists
+        collection = self.db[self.collection_name]
+
+        # Only deliver messages published after this worker started
+        latest = await collection.find_one(sort=[("$natural", -1)])
+        last_id = latest["_id"] if latest else None
+        self._task = asyncio.create_task(self._tail(collection, last_id, deliver))
+
+    async def _tail(self, collection, last_id, deliver):
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            try:
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc.pop("_id")
+                        deliver(doc)
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Change feed tail interrupted: {e}")
+            # Cursor dies on an empty capped collection; retry shortly
+            await asyncio.sleep(1)
+
+    async def publish(self, message):
+        await self.db[self.collection_name].insert_one(dict(message))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class Subscription:
+    # One connected client with a bounded outbound queue
+
+    def __init__(self, topics: Optional[Set[str]], max_queue: int):
+        self.id = str(uuid.uuid4())
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, collection: str, encoded: str):
+        if self.topics and collection not in self.topics:
+            return
+        try:
+            self.queue.put_nowait(encoded)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and tell it to resync instead of buffering forever
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(encode_message({"type": "resync", "dropped": self.dropped}))
+
+
+class ChangeBroker:
+    # Fans catalog changes out to websocket subscribers
+
+    def __init__(self, backend: PubSubBackend, max_queue: int = 100):
+        self.backend = backend
+        self.max_queue = max_queue
+        self.subscriptions: Dict[str, Subscription] = {}
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscription:
+        topic_set = {t for t in topics if t in FEED_TOPICS} if topics else None
+        subscription = Subscription(topic_set or None, self.max_queue)
+        self.subscriptions[subscription.id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.pop(subscription.id, None)
+
+    async def publish(self, collection: str, op: str, doc_id: str, data: Optional[dict] = None):
+        message = {
+            "type": "change",
+            "collection": collection,
+            "op": op,
+            "id": doc_id,
+            "data": data or {},
+            "ts": datetime.utcnow(),
+        }
+        try:
+            await self.backend.publish(message)
+        except Exception as e:
+            # A feed outage must never fail the write that triggered it
+            logger.error(f"Failed to publish change for {collection}/{doc_id}: {e}")
+
+    def _deliver(self, message: Dict[str, Any]):
+        if not self.subscriptions:
+            return
+        # Serialize once, share the string across every subscriber
+        encoded = encode_message(message)
+        collection = message.get("collection")
+        for subscription in list(self.subscriptions.values()):
+            subscription.offer(collection, encoded)
+
+
+def create_change_broker(db) -> ChangeBroker:
+    # Backend picked by CHANGE_FEED_BACKEND: "memory" (default) or "mongo"
+    backend_name = os.getenv("CHANGE_FEED_BACKEND", "memory").lower()
+    max_queue = int(os.getenv("CHANGE_FEED_MAX_QUEUE", "100"))
+    if backend_name == "mongo":
+        backend: PubSubBackend = MongoPubSub(db)
+    else:
+        backend = InProcessPubSub()
+    logger.info(f"Change feed using {backend.__class__.__name__}")
+    return ChangeBroker(backend, max_queue=max_queue)
@@ -0,0 +1,183 @@
+# Background search jobs: bounded worker pool, results and progress persisted to Mongo
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+
+# progress(stage, fraction) lets the job body report where it is
+ProgressCallback = Callable[[str, float], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class SearchJobRunner:
+    # Runs jobs on a fixed number of worker tasks so research can't exhaust the event loop
+
+    def __init__(
+        self,
+        collection,
+        handler: JobHandler,
+        workers: int = 2,
+        max_queue: int = 100,
+        result_ttl: timedelta = timedelta(hours=24),
+        poll_interval: float = 0.5,
+        job_timeout: float = 600,
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        # Deadline for one job; much longer than a request, which is why jobs exist
+        self.job_timeout = job_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+        # Queue slots claimed by submits still waiting on their insert
+        self._reserved = 0
+        # Local waiters get woken immediately; other workers' jobs are polled
+        self._events: Dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        # Running jobs that outlived their deadline belong to a worker that died
+        stale = datetime.utcnow() - timedelta(seconds=self.job_timeout + 60)
+        await self.collection.update_many(
+            {"status": "running", "updated_at": {"$lt": stale}},
+            {"$set": {"status": "failed", "error": "Job interrupted", "expires_at": datetime.utcnow() + self.result_ttl}}
+        )
+        await self._recover_queued()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def _recover_queued(self):
+        # Queued jobs only lived in a previous process's memory; workers claim them atomically,
+        # so picking up another live process's backlog can't run a job twice
+        cursor = self.collection.find({"status": "queued"}, {"_id": 0}).sort("created_at", 1)
+        async for job in cursor:
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                await self._update(job["id"], {
+                    "status": "failed",
+                    "stage": "done",
+                    "error": "Job interrupted",
+                    "expires_at": datetime.utcnow() + self.result_ttl,
+                })
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def submit(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # Claim the slot before awaiting the insert so concurrent submits can't overfill the queue
+        if self.queue.maxsize and self.queue.qsize() + self._reserved >= self.queue.maxsize:
+            raise JobQueueFull("Search job queue is full")
+        self._reserved += 1
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "params": params,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            await self.collection.insert_one(dict(job))
+        finally:
+            self._reserved -= 1
+        self._events[job["id"]] = asyncio.Event()
+        self.queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        # Long-poll: return as soon as the job finishes or the wait runs out
+        job = await self.collection.find_one({"id": job_id}, {"_id": 0})
+        if not job or job["status"] not in ACTIVE_STATES or wait <= 0:
+            return job
+
+        deadline = asyncio.get_running_loop().time() + wait
+        event = self._events.get(job_id)
+        while job and job["status"] in ACTIVE_STATES:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            if event:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(self.poll_interval, remaining))
+            job = await self.collection.find_one({"id": job_id}, {"_id": 0})
+        return job
+
+    async def _update(self, job_id: str, fields: Dict[str, Any]):
+        fields["updated_at"] = datetime.utcnow()
+        await self.collection.update_one({"id": job_id}, {"$set": fields})
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            job_id = job["id"]
+
+            async def progress(stage: str, fraction: float):
+                await self._update(job_id, {"stage": stage, "progress": round(fraction, 2)})
+
+            try:
+                claimed = await self.collection.update_one(
+                    {"id": job_id, "status": "queued"},
+                    {"$set": {"status": "running", "stage": "starting", "progress": 0.05, "updated_at": datetime.utcnow()}}
+                )
+                if not claimed.modified_count:
+                    # Already taken by another process, or finished while we were down
+                    continue
+                result = await self.handler(job, progress)
+                await self._update(job_id, {
+                    "status": "completed" if result.get("success", True) else "failed",
+                    "stage": "done",
+                    "progress": 1.0,
+                    "result": result,
+                    "error": result.get("error"),
+                    "expires_at": datetime.utcnow() + self.result_ttl,
+                })
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Search job {job_id} failed: {e}")
+                await self._update(job_id, {
+                    "status": "failed",
+                    "stage": "done",
+                    "error": str(e),
+                    "expires_at": datetime.utcnow() + self.result_ttl,
+                })
+            finally:
+                event = self._events.pop(job_id, None)
+                if event:
+                    event.set()
+                self.queue.task_done()
+
+
+def create_search_job_runner(db, handler: JobHandler) -> SearchJobRunner:
+    return SearchJobRunner(
+        db.search_jobs,
+        handler,
+        workers=int(os.getenv("SEARCH_JOB_WORKERS", "2")),
+        max_queue=int(os.getenv("SEARCH_JOB_MAX_QUEUE", "100")),
+        result_ttl=timedelta(hours=float(os.getenv("SEARCH_JOB_TTL_HOURS", "24"))),
+        job_timeout=float(os.getenv("SEARCH_JOB_TIMEOUT_SECONDS", "600")),
+    )
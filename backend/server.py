@@ -1,31 +1,130 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime
+import json
+import base64
+import hashlib
+import hmac
+import math
+from datetime import datetime, timedelta, timezone
+
+# Queue-based structured logging
+from logging_setup import RequestIdMiddleware, setup_logging
 
 # AI agents
 from ai_agents.agents import AgentConfig, SearchAgent, ChatAgent
+from ai_agents.retrieval import CatalogIndex
+
+# Mongo client, pool monitoring and circuit breaker
+from database import (
+    CircuitOpenError, PoolMonitor, catalog_database, create_circuit_breaker,
+    create_mongo_client, mongo_client_options,
+)
+
+# Per-command latency histograms and slow-query plans
+from command_monitor import create_command_monitor
+
+# Live change feed
+from realtime import create_change_broker, diff_fields
+
+# Shared-memory catalog snapshot for multi-worker deployments
+from catalog_snapshot import CatalogSnapshot, SnapshotPublisher, SnapshotResponse
+
+# Per-client rate limiting
+from rate_limit import (
+    MongoBackend, RateLimitMiddleware, create_client_identity, create_rate_limit_backend, default_rules,
+)
+
+# status_checks retention
+from status_retention import create_status_retention
+
+# Background search jobs
+from search_jobs import JobQueueFull, create_search_job_runner
+
+# Idempotency-Key handling for create routes
+from idempotency import IdempotencyConflict, create_idempotency_store
+
+# Static precompressed catalog export
+from static_export import create_static_exporter
+
+# Response compression
+from compression import CompressionMiddleware, etag_matches
+
+# Image uploads
+from images import KEY_PATTERN, content_type_for, create_image_pipeline
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Logging config: handlers run on a background thread, never on the event loop
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
+
 # MongoDB
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_monitor = PoolMonitor(mongo_client_options()["maxPoolSize"])
+command_monitor = create_command_monitor()
+mongo_listeners = [pool_monitor]
+if os.getenv("MONGO_COMMAND_MONITORING", "true").lower() == "true":
+    mongo_listeners.append(command_monitor)
+client = create_mongo_client(mongo_url, mongo_listeners)
 db = client[os.environ['DB_NAME']]
+# Catalog reads honour MONGO_CATALOG_READ_PREFERENCE and go through the breaker
+catalog_db = catalog_database(client, os.environ['DB_NAME'])
+catalog_breaker = create_circuit_breaker()
+
+# Change feed for websocket subscribers
+change_broker = create_change_broker(db)
+CHANGE_FEED_PING_SECONDS = float(os.getenv("CHANGE_FEED_PING_SECONDS", "30"))
+
+# Catalog snapshot, enabled by CATALOG_SNAPSHOT_PATH
+snapshot_path = os.getenv("CATALOG_SNAPSHOT_PATH")
+catalog_snapshot: Optional[CatalogSnapshot] = CatalogSnapshot(Path(snapshot_path)) if snapshot_path else None
+snapshot_publisher: Optional[SnapshotPublisher] = None
+
+# TTL expiry and downsampling for status_checks
+status_retention = create_status_retention(db)
+status_retention_task: Optional[asyncio.Task] = None
+
+# Long-running research runs on a bounded pool of background workers
+search_jobs = create_search_job_runner(db, lambda job, progress: run_search_job(job, progress))
+
+# Static export; regenerated after writes only when STATIC_EXPORT_DIR is configured
+static_exporter = create_static_exporter(lambda: build_catalog_snapshot(), ROOT_DIR)
+STATIC_EXPORT_AUTO = bool(os.getenv("STATIC_EXPORT_DIR"))
+
+# Verified caller identity: peer IP (or forwarded IP via TRUSTED_PROXIES) or a known API key;
+# stable_id() drops the IP for state that must survive a network change
+client_identity = create_client_identity()
+
+# Replay store for Idempotency-Key retries
+idempotency_store = create_idempotency_store(db)
+
+# Admin routes require X-Admin-Key; they are disabled unless ADMIN_API_KEY is set
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Uploaded images and their resized variants
+image_pipeline = create_image_pipeline(ROOT_DIR)
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
 
 # AI agents init
 agent_config = AgentConfig()
 search_agent: Optional[SearchAgent] = None
 chat_agent: Optional[ChatAgent] = None
+# Local catalog index for grounding and direct answers
+catalog_index = CatalogIndex()
+INDEX_KINDS = {"menu_items": "menu", "locations": "location", "food_truck_info": "truck"}
+catalog_index_task: Optional[asyncio.Task] = None
 
 # Main app
 app = FastAPI(title="AI Agents API", description="Minimal AI Agents API with LangGraph and MCP support")
@@ -34,6 +133,36 @@ app = FastAPI(title="AI Agents API", description="Minimal AI Agents API with Lan
 api_router = APIRouter(prefix="/api")
 
 
+# Status rollup granularity -> (collection, bucket width, default query window)
+STATUS_ROLLUPS = {
+    "minute": ("status_rollups_minute", timedelta(minutes=1), timedelta(hours=1)),
+    "hour": ("status_rollups_hour", timedelta(hours=1), timedelta(days=1)),
+}
+MAX_SUMMARY_BUCKETS = 10000
+
+# Catalog collections tracked by delta sync
+SYNC_COLLECTIONS = ("menu_items", "locations", "food_truck_info")
+# Matches documents that have not been soft-deleted
+NOT_DELETED = {"deleted_at": None}
+EPOCH = datetime(1970, 1, 1)
+# updated_at is stamped before the write commits and worker clocks drift; sync cursors stay this far behind now
+SYNC_SAFETY_WINDOW = timedelta(seconds=float(os.getenv("SYNC_SAFETY_WINDOW_SECONDS", "10")))
+# Fields list views can skip on /bootstrap
+HEAVY_FIELDS = ("description", "image_url", "logo_url", "banner_url", "social_media")
+BOOTSTRAP_MAX_AGE = int(os.getenv("BOOTSTRAP_MAX_AGE", "30"))
+
+
+# Placeholder catalog served while the database is empty; fixed ids and timestamps keep the
+# /bootstrap ETag stable so 304s and the compression cache still hit
+SAMPLE_TIMESTAMP = datetime(2024, 1, 1)
+
+
+def utcnow_ms() -> datetime:
+    # Mongo stores milliseconds; truncating keeps sync cursors exact
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
 # Models
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -43,6 +172,28 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Status analytics models
+class StatusBucket(BaseModel):
+    client_name: str
+    bucket_start: datetime
+    count: int
+
+class StatusClient(BaseModel):
+    client_name: str
+    first_seen: datetime
+    last_seen: datetime
+    total: int
+
+class StatusSummary(BaseModel):
+    bucket: str
+    start: datetime
+    end: datetime
+    buckets: List[StatusBucket]
+    totals: Dict[str, int]
+    clients: List[StatusClient]
+    # True when buckets was cut at MAX_SUMMARY_BUCKETS; totals always cover the whole window
+    truncated: bool = False
+
 
 # Food Truck Models
 class MenuItem(BaseModel):
@@ -54,6 +205,7 @@ class MenuItem(BaseModel):
     image_url: Optional[str] = None
     available: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=utcnow_ms)
 
 class MenuItemCreate(BaseModel):
     name: str
@@ -72,6 +224,7 @@ class Location(BaseModel):
     schedule: Optional[str] = None
     active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=utcnow_ms)
 
 class LocationCreate(BaseModel):
     name: str
@@ -91,6 +244,7 @@ class FoodTruckInfo(BaseModel):
     logo_url: Optional[str] = None
     banner_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=utcnow_ms)
 
 class FoodTruckInfoCreate(BaseModel):
     name: str
@@ -101,11 +255,21 @@ class FoodTruckInfoCreate(BaseModel):
     logo_url: Optional[str] = None
     banner_url: Optional[str] = None
 
+# Delta sync models
+class SyncResponse(BaseModel):
+    cursor: str
+    has_more: bool
+    menu_items: List[MenuItem] = Field(default_factory=list)
+    locations: List[Location] = Field(default_factory=list)
+    food_truck_info: List[FoodTruckInfo] = Field(default_factory=list)
+    deleted: Dict[str, List[str]] = Field(default_factory=dict)
+
 # AI agent models
 class ChatRequest(BaseModel):
     message: str
     agent_type: str = "chat"  # "chat" or "search"
     context: Optional[dict] = None
+    timeout_ms: Optional[int] = None  # Capped at AI_TIMEOUT_SECONDS
 
 
 class ChatResponse(BaseModel):
@@ -114,12 +278,14 @@ class ChatResponse(BaseModel):
     agent_type: str
     capabilities: List[str]
     metadata: dict = Field(default_factory=dict)
+    model: Optional[str] = None
     error: Optional[str] = None
 
 
 class SearchRequest(BaseModel):
     query: str
     max_results: int = 5
+    timeout_ms: Optional[int] = None  # Capped at AI_TIMEOUT_SECONDS, or SEARCH_JOB_TIMEOUT_SECONDS for jobs
 
 
 class SearchResponse(BaseModel):
@@ -128,34 +294,330 @@ class SearchResponse(BaseModel):
     summary: str
     search_results: Optional[dict] = None
     sources_count: int
+    model: Optional[str] = None
+    error: Optional[str] = None
+
+
+class SearchJob(BaseModel):
+    id: str
+    status: str  # queued, running, completed or failed
+    stage: str
+    progress: float
+    query: str
+    result: Optional[SearchResponse] = None
     error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+# Idempotent creates
+async def idempotent(request: Request, response: Response, scope: str, key: Optional[str], payload, handler):
+    # Without a key the handler just runs; with one, retries replay the first response
+    if not key:
+        return await handler()
+    client = client_identity.stable_id(request.scope)
+    try:
+        result, replayed = await idempotency_store.run(scope, client, key, payload, handler)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Hello World"}
 
+# Health checks
+@api_router.get("/health/live")
+async def liveness():
+    # Process is up and serving; no dependency checks
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    # Ready when Mongo answers a ping and the pool isn't exhausted
+    checks = {"pool": pool_monitor.stats(), "circuit": catalog_breaker.stats()}
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=2)
+        checks["mongo"] = "ok"
+    except Exception as e:
+        checks["mongo"] = f"error: {e}"
+
+    ready = checks["mongo"] == "ok" and not pool_monitor.saturated()
+    checks["status"] = "ready" if ready else "unavailable"
+    return JSONResponse(status_code=200 if ready else 503, content=checks)
+
 @api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+async def create_status_check(
+    input: StatusCheckCreate, request: Request, response: Response, idempotency_key: Optional[str] = Header(None)
+):
+    async def create():
+        status_dict = input.dict()
+        status_obj = StatusCheck(**status_dict)
+        _ = await db.status_checks.insert_one(status_obj.dict())
+        await record_status_rollups(status_obj)
+        return status_obj
+    return await idempotent(request, response, "POST /status", idempotency_key, input, create)
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+# Status analytics
+def as_utc(ts: datetime) -> datetime:
+    # Stored timestamps are naive UTC
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
 
-# Food Truck routes
-@api_router.get("/foodtruck", response_model=FoodTruckInfo)
-async def get_food_truck_info():
-    info = await db.food_truck_info.find_one()
+
+def bucket_start(ts: datetime, width: timedelta) -> datetime:
+    return EPOCH + (ts - EPOCH) // width * width
+
+
+async def record_status_rollups(status: StatusCheck):
+    # O(1) $inc upserts per heartbeat, so dashboards never scan raw rows
+    updates = [
+        db[collection].update_one(
+            {"client_name": status.client_name, "bucket_start": bucket_start(status.timestamp, width)},
+            {"$inc": {"count": 1}},
+            upsert=True
+        )
+        for collection, width, _ in STATUS_ROLLUPS.values()
+    ]
+    updates.append(db.status_clients.update_one(
+        {"client_name": status.client_name},
+        {
+            "$inc": {"total": 1},
+            "$max": {"last_seen": status.timestamp},
+            "$setOnInsert": {"first_seen": status.timestamp},
+        },
+        upsert=True
+    ))
+    try:
+        await asyncio.gather(*updates)
+    except Exception as e:
+        # The heartbeat is already stored; a missed rollup shouldn't fail it
+        logger.error(f"Failed to update status rollups for {status.client_name}: {e}")
+
+
+@api_router.get("/status/summary", response_model=StatusSummary)
+async def get_status_summary(
+    bucket: str = "hour",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    client_name: Optional[str] = None,
+):
+    # Per-client counts per bucket from the rollups, plus last-seen per client
+    if bucket not in STATUS_ROLLUPS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(STATUS_ROLLUPS)}")
+    collection, width, window = STATUS_ROLLUPS[bucket]
+    end = as_utc(end) if end else datetime.utcnow()
+    start = as_utc(start) if start else end - window
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if math.ceil((end - bucket_start(start, width)) / width) > MAX_SUMMARY_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window spans more than {MAX_SUMMARY_BUCKETS} {bucket} buckets; narrow it or use a wider bucket",
+        )
+
+    query = {"bucket_start": {"$gte": bucket_start(start, width), "$lt": end}}
+    client_query = {}
+    if client_name:
+        query["client_name"] = client_name
+        client_query["client_name"] = client_name
+
+    rows, total_rows, clients = await asyncio.gather(
+        db[collection].find(query, {"_id": 0}).sort("bucket_start", 1).to_list(MAX_SUMMARY_BUCKETS + 1),
+        db[collection].aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$client_name", "count": {"$sum": "$count"}}},
+        ]).to_list(None),
+        db.status_clients.find(client_query, {"_id": 0}).sort("last_seen", -1).to_list(1000),
+    )
+    # Many clients can still overflow the bucket list; say so instead of silently dropping rows
+    truncated = len(rows) > MAX_SUMMARY_BUCKETS
+    rows = rows[:MAX_SUMMARY_BUCKETS]
+    totals = {row["_id"]: row["count"] for row in total_rows}
+
+    return StatusSummary(
+        bucket=bucket,
+        start=start,
+        end=end,
+        buckets=[StatusBucket(**row) for row in rows],
+        totals=totals,
+        clients=[StatusClient(**c) for c in clients],
+        truncated=truncated,
+    )
+
+
+# Admin routes
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    # Fail closed: without a configured key the admin surface doesn't exist
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_key or "", ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+@api_router.get("/admin/status/retention", dependencies=[Depends(require_admin)])
+async def get_status_retention():
+    # Size of status_checks, TTL settings and archive progress
+    return jsonable_encoder(await status_retention.report())
+
+
+@api_router.post("/admin/export", dependencies=[Depends(require_admin)])
+async def export_static_catalog():
+    # Render foodtruck/menu/locations to hashed, precompressed files plus a manifest
+    try:
+        manifest = await static_exporter.export()
+    except Exception as e:
+        logger.error(f"Static export failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Export failed: {e}")
+    return {"success": True, "directory": str(static_exporter.out_dir), "manifest": manifest}
+
+
+@api_router.get("/admin/mongo/commands", dependencies=[Depends(require_admin)])
+async def get_mongo_command_stats(limit: int = Query(20, ge=1, le=200)):
+    # Latency histograms per (collection, command), heaviest total time first
+    return {"slow_ms": command_monitor.slow_us / 1000, "commands": command_monitor.stats(limit)}
+
+
+@api_router.get("/admin/mongo/slow-queries", dependencies=[Depends(require_admin)])
+async def get_mongo_slow_queries(limit: int = Query(20, ge=1, le=200)):
+    # Slow log grouped by query shape with the captured plan; collscan marks a missing index
+    return {
+        "slow_ms": command_monitor.slow_us / 1000,
+        "offenders": command_monitor.top_slow(limit),
+        "recent": list(command_monitor.slow_queries)[-limit:][::-1],
+    }
+
+
+@api_router.delete("/admin/mongo/stats", dependencies=[Depends(require_admin)])
+async def reset_mongo_stats():
+    command_monitor.reset()
+    return {"success": True}
+
+
+def dump_json(content) -> bytes:
+    # Same encoding FastAPI uses for JSON responses
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+async def catalog_changed(
+    collection: str, op: str, doc_id: str, doc: Optional[dict] = None, previous: Optional[dict] = None
+):
+    # Called after every catalog write: notify live clients, refresh derived copies
+    data = diff_fields(previous, doc) if op == "update" else doc
+    await change_broker.publish(collection, op, doc_id, data)
+    if snapshot_publisher:
+        snapshot_publisher.mark_dirty()
+    if STATIC_EXPORT_AUTO:
+        static_exporter.mark_dirty()
+    index_catalog_doc(collection, op, doc_id, doc)
+
+
+def index_catalog_doc(collection: str, op: str, doc_id: str, doc: Optional[dict]):
+    # The truck has a single document, so it gets a fixed index key
+    key = "food_truck_info" if collection == "food_truck_info" else doc_id
+    if op == "delete":
+        catalog_index.remove(key)
+    elif doc is not None:
+        catalog_index.upsert(INDEX_KINDS[collection], key, doc)
+
+
+async def rebuild_catalog_index():
+    # Full rebuild; writes handled by other workers are picked up here
+    global catalog_index
+    try:
+        info, menu, locations = await asyncio.gather(_load_food_truck_info(), _load_menu(), _load_locations())
+    except Exception as e:
+        logger.error(f"Failed to rebuild catalog index: {e}")
+        return
+    index = CatalogIndex()
+    index.upsert("truck", "food_truck_info", info)
+    for item in menu:
+        index.upsert("menu", item["id"], item)
+    for loc in locations:
+        index.upsert("location", loc["id"], loc)
+    catalog_index = index
+
+
+async def refresh_catalog_index_periodically(interval: float):
+    while True:
+        await rebuild_catalog_index()
+        await asyncio.sleep(interval)
+
+
+def grounded_prompt(question: str) -> str:
+    # Prepend matching catalog snippets so the agent answers from our data
+    context = catalog_index.context_for(question)
+    if not context:
+        return question
+    return f"{context}\n\nUse the data above when it is relevant.\n\nQuestion: {question}"
+
+
+def snapshot_section(name: str):
+    return catalog_snapshot.section(name) if catalog_snapshot else None
+
+
+async def build_catalog_snapshot() -> Dict[str, bytes]:
+    # Straight from the primary, never the breaker cache or a lagging secondary, so stale data isn't republished
+    info, menu, locations = await asyncio.gather(
+        _load_food_truck_info(database=db), _load_menu(database=db), _load_locations(database=db)
+    )
+    return {
+        "foodtruck": dump_json(FoodTruckInfo(**info)),
+        "menu": dump_json([MenuItem(**item) for item in menu]),
+        "locations": dump_json([Location(**loc) for loc in locations]),
+    }
+
+
+# Catalog loaders shared by the single-collection routes and /bootstrap
+def catalog_projection(exclude: tuple = ()) -> dict:
+    projection = {"_id": 0, "deleted_at": 0}
+    projection.update({field: 0 for field in exclude})
+    return projection
+
+
+def strip_fields(doc: dict, exclude: tuple = ()) -> dict:
+    for field in exclude:
+        doc.pop(field, None)
+    return doc
+
+
+async def catalog_read(key: tuple, loader):
+    # Serve the last good result while Mongo is failing, else fail fast with 503
+    try:
+        return await catalog_breaker.call(key, loader)
+    except CircuitOpenError as e:
+        logger.error(f"Catalog read {key[0]} unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Catalog temporarily unavailable", headers={"Retry-After": "5"})
+
+
+async def load_food_truck_info(exclude: tuple = ()) -> dict:
+    return await catalog_read(("food_truck_info", exclude), lambda: _load_food_truck_info(exclude))
+
+
+async def load_menu(exclude: tuple = ()) -> List[dict]:
+    return await catalog_read(("menu_items", exclude), lambda: _load_menu(exclude))
+
+
+async def load_locations(exclude: tuple = ()) -> List[dict]:
+    return await catalog_read(("locations", exclude), lambda: _load_locations(exclude))
+
+
+async def _load_food_truck_info(exclude: tuple = (), database=None) -> dict:
+    # Catalog reads default to catalog_db; snapshot builds pass the primary db
+    database = catalog_db if database is None else database
+    info = await database.food_truck_info.find_one(NOT_DELETED, catalog_projection(exclude))
     if not info:
         # Return default info if none exists
         default_info = {
-            "id": str(uuid.uuid4()),
+            "id": "sample-truck",
             "name": "Tasty Wheels Food Truck",
             "description": "Serving delicious street food with fresh ingredients and bold flavors",
             "phone": "(555) 123-4567",
@@ -164,154 +626,399 @@ async def get_food_truck_info():
                 "instagram": "@tastywheels",
                 "facebook": "TastyWheelsFoodTruck"
             },
-            "created_at": datetime.utcnow()
+            "created_at": SAMPLE_TIMESTAMP,
+            "updated_at": SAMPLE_TIMESTAMP
         }
-        return FoodTruckInfo(**default_info)
-    return FoodTruckInfo(**info)
-
-@api_router.put("/foodtruck", response_model=FoodTruckInfo)
-async def update_food_truck_info(info: FoodTruckInfoCreate):
-    existing = await db.food_truck_info.find_one()
-    info_dict = info.dict()
-
-    if existing:
-        info_dict["id"] = existing["id"]
-        info_dict["created_at"] = existing["created_at"]
-        await db.food_truck_info.replace_one({"id": existing["id"]}, info_dict)
-    else:
-        info_obj = FoodTruckInfo(**info_dict)
-        await db.food_truck_info.insert_one(info_obj.dict())
-        return info_obj
+        return strip_fields(FoodTruckInfo(**default_info).dict(), exclude)
+    return info
 
-    return FoodTruckInfo(**info_dict)
 
-# Menu routes
-@api_router.get("/menu", response_model=List[MenuItem])
-async def get_menu():
-    menu_items = await db.menu_items.find().to_list(1000)
+async def _load_menu(exclude: tuple = (), database=None) -> List[dict]:
+    database = catalog_db if database is None else database
+    menu_items = await database.menu_items.find(NOT_DELETED, catalog_projection(exclude)).to_list(1000)
     if not menu_items:
         # Return sample menu if none exists
         sample_menu = [
             {
-                "id": str(uuid.uuid4()),
+                "id": "sample-gourmet-burger",
                 "name": "Gourmet Burger",
                 "description": "Juicy beef patty with fresh lettuce, tomato, and our special sauce",
                 "price": 12.99,
                 "category": "Burgers",
                 "available": True,
-                "created_at": datetime.utcnow()
+                "created_at": SAMPLE_TIMESTAMP,
+                "updated_at": SAMPLE_TIMESTAMP
             },
             {
-                "id": str(uuid.uuid4()),
+                "id": "sample-fish-tacos",
                 "name": "Fish Tacos",
                 "description": "Crispy fish with cabbage slaw and lime crema in soft tortillas",
                 "price": 9.99,
                 "category": "Tacos",
                 "available": True,
-                "created_at": datetime.utcnow()
+                "created_at": SAMPLE_TIMESTAMP,
+                "updated_at": SAMPLE_TIMESTAMP
             },
             {
-                "id": str(uuid.uuid4()),
+                "id": "sample-loaded-fries",
                 "name": "Loaded Fries",
                 "description": "Crispy fries topped with cheese, bacon, and green onions",
                 "price": 7.99,
                 "category": "Sides",
                 "available": True,
-                "created_at": datetime.utcnow()
+                "created_at": SAMPLE_TIMESTAMP,
+                "updated_at": SAMPLE_TIMESTAMP
             }
         ]
-        return [MenuItem(**item) for item in sample_menu]
-    return [MenuItem(**item) for item in menu_items]
-
-@api_router.post("/menu", response_model=MenuItem)
-async def create_menu_item(item: MenuItemCreate):
-    item_obj = MenuItem(**item.dict())
-    await db.menu_items.insert_one(item_obj.dict())
-    return item_obj
+        return [strip_fields(MenuItem(**item).dict(), exclude) for item in sample_menu]
+    return menu_items
 
-@api_router.put("/menu/{item_id}", response_model=MenuItem)
-async def update_menu_item(item_id: str, item: MenuItemCreate):
-    item_dict = item.dict()
-    existing = await db.menu_items.find_one({"id": item_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Menu item not found")
 
-    item_dict["id"] = item_id
-    item_dict["created_at"] = existing["created_at"]
-    await db.menu_items.replace_one({"id": item_id}, item_dict)
-    return MenuItem(**item_dict)
-
-@api_router.delete("/menu/{item_id}")
-async def delete_menu_item(item_id: str):
-    result = await db.menu_items.delete_one({"id": item_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return {"success": True, "message": "Menu item deleted"}
-
-# Location routes
-@api_router.get("/locations", response_model=List[Location])
-async def get_locations():
-    locations = await db.locations.find().to_list(1000)
+async def _load_locations(exclude: tuple = (), database=None) -> List[dict]:
+    database = catalog_db if database is None else database
+    locations = await database.locations.find(NOT_DELETED, catalog_projection(exclude)).to_list(1000)
     if not locations:
         # Return sample locations if none exist
         sample_locations = [
             {
-                "id": str(uuid.uuid4()),
+                "id": "sample-downtown-plaza",
                 "name": "Downtown Plaza",
                 "address": "123 Main St, Downtown",
                 "latitude": 40.7128,
                 "longitude": -74.0060,
                 "schedule": "Mon-Fri: 11:30AM-2:30PM",
                 "active": True,
-                "created_at": datetime.utcnow()
+                "created_at": SAMPLE_TIMESTAMP,
+                "updated_at": SAMPLE_TIMESTAMP
             },
             {
-                "id": str(uuid.uuid4()),
+                "id": "sample-business-district",
                 "name": "Business District",
                 "address": "456 Corporate Blvd",
                 "latitude": 40.7580,
                 "longitude": -73.9855,
                 "schedule": "Mon-Fri: 12:00PM-3:00PM",
                 "active": True,
-                "created_at": datetime.utcnow()
+                "created_at": SAMPLE_TIMESTAMP,
+                "updated_at": SAMPLE_TIMESTAMP
             }
         ]
-        return [Location(**loc) for loc in sample_locations]
-    return [Location(**loc) for loc in locations]
+        return [strip_fields(Location(**loc).dict(), exclude) for loc in sample_locations]
+    return locations
+
+
+# Food Truck routes
+@api_router.get("/foodtruck", response_model=FoodTruckInfo)
+async def get_food_truck_info():
+    cached = snapshot_section("foodtruck")
+    if cached is not None:
+        return SnapshotResponse(cached, media_type="application/json")
+    return FoodTruckInfo(**await load_food_truck_info())
+
+@api_router.put("/foodtruck", response_model=FoodTruckInfo)
+async def update_food_truck_info(info: FoodTruckInfoCreate):
+    existing = await db.food_truck_info.find_one(NOT_DELETED)
+    info_dict = info.dict()
+
+    if existing:
+        info_dict["id"] = existing["id"]
+        info_dict["created_at"] = existing["created_at"]
+        info_dict["updated_at"] = utcnow_ms()
+        await db.food_truck_info.replace_one({"id": existing["id"]}, info_dict)
+        await catalog_changed("food_truck_info", "update", existing["id"], info_dict, existing)
+    else:
+        info_obj = FoodTruckInfo(**info_dict)
+        await db.food_truck_info.insert_one(info_obj.dict())
+        await catalog_changed("food_truck_info", "insert", info_obj.id, info_obj.dict())
+        return info_obj
+
+    return FoodTruckInfo(**info_dict)
+
+# Menu routes
+@api_router.get("/menu", response_model=List[MenuItem])
+async def get_menu():
+    cached = snapshot_section("menu")
+    if cached is not None:
+        return SnapshotResponse(cached, media_type="application/json")
+    return [MenuItem(**item) for item in await load_menu()]
+
+@api_router.post("/menu", response_model=MenuItem)
+async def create_menu_item(
+    item: MenuItemCreate, request: Request, response: Response, idempotency_key: Optional[str] = Header(None)
+):
+    async def create():
+        item_obj = MenuItem(**item.dict())
+        await db.menu_items.insert_one(item_obj.dict())
+        await catalog_changed("menu_items", "insert", item_obj.id, item_obj.dict())
+        return item_obj
+    return await idempotent(request, response, "POST /menu", idempotency_key, item, create)
+
+@api_router.put("/menu/{item_id}", response_model=MenuItem)
+async def update_menu_item(item_id: str, item: MenuItemCreate):
+    item_dict = item.dict()
+    existing = await db.menu_items.find_one({"id": item_id, **NOT_DELETED})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+
+    item_dict["id"] = item_id
+    item_dict["created_at"] = existing["created_at"]
+    item_dict["updated_at"] = utcnow_ms()
+    await db.menu_items.replace_one({"id": item_id}, item_dict)
+    await catalog_changed("menu_items", "update", item_id, item_dict, existing)
+    return MenuItem(**item_dict)
+
+@api_router.delete("/menu/{item_id}")
+async def delete_menu_item(item_id: str):
+    # Soft delete so sync clients see a tombstone
+    now = utcnow_ms()
+    result = await db.menu_items.update_one(
+        {"id": item_id, **NOT_DELETED},
+        {"$set": {"deleted_at": now, "updated_at": now}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    await catalog_changed("menu_items", "delete", item_id)
+    return {"success": True, "message": "Menu item deleted"}
+
+# Location routes
+@api_router.get("/locations", response_model=List[Location])
+async def get_locations():
+    cached = snapshot_section("locations")
+    if cached is not None:
+        return SnapshotResponse(cached, media_type="application/json")
+    return [Location(**loc) for loc in await load_locations()]
 
 @api_router.post("/locations", response_model=Location)
-async def create_location(location: LocationCreate):
-    location_obj = Location(**location.dict())
-    await db.locations.insert_one(location_obj.dict())
-    return location_obj
+async def create_location(
+    location: LocationCreate, request: Request, response: Response, idempotency_key: Optional[str] = Header(None)
+):
+    async def create():
+        location_obj = Location(**location.dict())
+        await db.locations.insert_one(location_obj.dict())
+        await catalog_changed("locations", "insert", location_obj.id, location_obj.dict())
+        return location_obj
+    return await idempotent(request, response, "POST /locations", idempotency_key, location, create)
 
 @api_router.put("/locations/{location_id}", response_model=Location)
 async def update_location(location_id: str, location: LocationCreate):
     location_dict = location.dict()
-    existing = await db.locations.find_one({"id": location_id})
+    existing = await db.locations.find_one({"id": location_id, **NOT_DELETED})
     if not existing:
         raise HTTPException(status_code=404, detail="Location not found")
 
     location_dict["id"] = location_id
     location_dict["created_at"] = existing["created_at"]
+    location_dict["updated_at"] = utcnow_ms()
     await db.locations.replace_one({"id": location_id}, location_dict)
+    await catalog_changed("locations", "update", location_id, location_dict, existing)
     return Location(**location_dict)
 
 @api_router.delete("/locations/{location_id}")
 async def delete_location(location_id: str):
-    result = await db.locations.delete_one({"id": location_id})
-    if result.deleted_count == 0:
+    # Soft delete so sync clients see a tombstone
+    now = utcnow_ms()
+    result = await db.locations.update_one(
+        {"id": location_id, **NOT_DELETED},
+        {"$set": {"deleted_at": now, "updated_at": now}}
+    )
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Location not found")
+    await catalog_changed("locations", "delete", location_id)
     return {"success": True, "message": "Location deleted"}
 
 
+# Storefront bootstrap
+@api_router.get("/bootstrap")
+async def get_bootstrap(request: Request, exclude: Optional[str] = None, lite: bool = False):
+    # Truck info, menu and locations in one round trip; lite drops heavy fields
+    fields = tuple(HEAVY_FIELDS) if lite else ()
+    if exclude:
+        requested = tuple(f.strip() for f in exclude.split(",") if f.strip())
+        unknown = [f for f in requested if f not in HEAVY_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Cannot exclude fields: {', '.join(unknown)}")
+        fields = tuple(dict.fromkeys(fields + requested))
+
+    sections = [snapshot_section(name) for name in ("foodtruck", "menu", "locations")] if not fields else []
+    if sections and all(section is not None for section in sections):
+        # Stitch the pre-serialized snapshot sections together without re-encoding
+        body = b"".join([
+            b'{"foodtruck":', sections[0], b',"menu":', sections[1], b',"locations":', sections[2], b"}"
+        ])
+    else:
+        info, menu, locations = await asyncio.gather(
+            load_food_truck_info(fields),
+            load_menu(fields),
+            load_locations(fields),
+        )
+        body = dump_json({"foodtruck": info, "menu": menu, "locations": locations})
+
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={BOOTSTRAP_MAX_AGE}"}
+    # Clients may hold the gzip or br variant's tag; echo back whichever one matched
+    matched = etag_matches(request.headers.get("if-none-match"), etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Delta sync
+def encode_sync_cursor(positions: Dict[str, list]) -> str:
+    raw = json.dumps(positions, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> Dict[str, list]:
+    # Cursor holds the last settled (updated_at ms, id) per collection, optionally followed by
+    # the (updated_at ms, id) reached while paging through changes still inside the safety window
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded))
+        decoded = {}
+        for name, pos in positions.items():
+            if name not in SYNC_COLLECTIONS:
+                continue
+            if len(pos) not in (2, 4):
+                raise ValueError("bad position")
+            decoded[name] = [int(value) if i % 2 == 0 else str(value) for i, value in enumerate(pos)]
+        return decoded
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+async def fetch_changes(collection_name: str, position: Optional[list], limit: int) -> List[dict]:
+    # Walks the (updated_at, id) index from the client's last position
+    query = {}
+    if position:
+        since = EPOCH + timedelta(milliseconds=position[0])
+        query = {"$or": [
+            {"updated_at": {"$gt": since}},
+            {"updated_at": since, "id": {"$gt": position[1]}},
+        ]}
+    cursor = db[collection_name].find(query).sort([("updated_at", 1), ("id", 1)]).limit(limit)
+    return await cursor.to_list(limit)
+
+
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync_catalog(since: Optional[str] = None, limit: int = 500):
+    # Changes since the client's cursor; full catalog when no cursor given
+    limit = max(1, min(limit, 1000))
+    positions = decode_sync_cursor(since) if since else {}
+
+    # Paging through the safety window resumes from the page position, otherwise from the settled one
+    results = await asyncio.gather(*[
+        fetch_changes(name, (positions.get(name) or [])[-2:] or None, limit) for name in SYNC_COLLECTIONS
+    ])
+
+    response = SyncResponse(cursor="", has_more=False)
+    models = {"menu_items": MenuItem, "locations": Location, "food_truck_info": FoodTruckInfo}
+    horizon = (utcnow_ms() - SYNC_SAFETY_WINDOW - EPOCH) // timedelta(milliseconds=1)
+    for name, docs in zip(SYNC_COLLECTIONS, results):
+        position = positions.get(name)
+        page_full = len(docs) == limit
+        response.has_more = response.has_more or page_full
+        if docs:
+            last = docs[-1]
+            last_ms = (last["updated_at"] - EPOCH) // timedelta(milliseconds=1)
+            settled = position[:2] if position else None
+            paging = bool(position) and len(position) == 4
+            if not paging:
+                # Only a read that started at the settled position may move it
+                if last_ms <= horizon:
+                    settled = [last_ms, last["id"]]
+                elif settled is None or settled[0] < horizon:
+                    # Recent changes are sent now and again next time, so a write that commits late isn't skipped
+                    settled = [horizon, ""]
+            if page_full and (paging or last_ms > horizon):
+                # More changes inside the window: step past this page without settling on it
+                positions[name] = settled + [last_ms, last["id"]]
+            elif settled:
+                positions[name] = settled
+        elif position:
+            # End of the window pass; the next sync rescans it from the settled position
+            positions[name] = position[:2]
+        upserts = [models[name](**doc) for doc in docs if doc.get("deleted_at") is None]
+        setattr(response, name, upserts)
+        deleted = [doc["id"] for doc in docs if doc.get("deleted_at") is not None]
+        if deleted:
+            response.deleted[name] = deleted
+
+    response.cursor = encode_sync_cursor(positions)
+    return response
+
+
+# Image routes
+@api_router.post("/images")
+async def upload_image(file: UploadFile = File(...)):
+    # Store an image; use the returned URLs for image_url, logo_url or banner_url
+    data = await file.read(image_pipeline.max_bytes + 1)
+    try:
+        result = await image_pipeline.ingest(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **result}
+
+@api_router.get("/images/{key}")
+async def get_image(key: str):
+    # Keys are content-addressed, so responses never change and can be cached forever
+    if not KEY_PATTERN.match(key):
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {"Cache-Control": IMMUTABLE_CACHE, "ETag": f'"{key}"'}
+
+    path = image_pipeline.store.local_path(key)
+    if path:
+        return FileResponse(path, media_type=content_type_for(key), headers=headers)
+    data = await image_pipeline.store.get(key)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=data, media_type=content_type_for(key), headers=headers)
+
+
+# Live feed
+@api_router.websocket("/ws/changes")
+async def catalog_changes_feed(websocket: WebSocket, topics: Optional[str] = None):
+    # Push catalog diffs; topics is a comma-separated subset of menu_items,locations,food_truck_info
+    await websocket.accept()
+    subscription = change_broker.subscribe(topics.split(",") if topics else None)
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), timeout=CHANGE_FEED_PING_SECONDS)
+            except asyncio.TimeoutError:
+                # Heartbeat so dead connections get noticed and cleaned up
+                message = '{"type":"ping"}'
+            await websocket.send_text(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        change_broker.unsubscribe(subscription)
+
+
 # AI agent routes
+def request_timeout(timeout_ms: Optional[int]) -> float:
+    # Client deadline, never longer than the server-wide limit
+    if timeout_ms is None or timeout_ms <= 0:
+        return agent_config.timeout_seconds
+    return min(timeout_ms / 1000, agent_config.timeout_seconds)
+
+
 @api_router.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(request: ChatRequest):
     # Chat with AI agent
     global search_agent, chat_agent
     
     try:
+        # Simple catalog lookups are answered from the local index
+        direct = catalog_index.answer(request.message)
+        if direct:
+            return ChatResponse(
+                success=True,
+                response=direct,
+                agent_type=request.agent_type,
+                capabilities=["catalog_lookup"],
+                metadata={"source": "catalog_index"}
+            )
+        
         # Init agents if needed
         if request.agent_type == "search" and search_agent is None:
             search_agent = SearchAgent(agent_config)
@@ -326,7 +1033,7 @@ async def chat_with_agent(request: ChatRequest):
             raise HTTPException(status_code=500, detail="Failed to initialize agent")
         
         # Execute agent
-        response = await agent.execute(request.message)
+        response = await agent.execute(grounded_prompt(request.message), timeout=request_timeout(request.timeout_ms))
         
         return ChatResponse(
             success=response.success,
@@ -334,6 +1041,7 @@ async def chat_with_agent(request: ChatRequest):
             agent_type=request.agent_type,
             capabilities=agent.get_capabilities(),
             metadata=response.metadata,
+            model=response.metadata.get("model"),
             error=response.error
         )
         
@@ -351,16 +1059,34 @@ async def chat_with_agent(request: ChatRequest):
 @api_router.post("/search", response_model=SearchResponse)
 async def search_and_summarize(request: SearchRequest):
     # Web search with AI summary
+    return await summarize_search(request, request_timeout(request.timeout_ms))
+
+
+async def summarize_search(request: SearchRequest, timeout: float) -> SearchResponse:
     global search_agent
     
     try:
+        # Questions about our own catalog don't need a web search
+        direct = catalog_index.answer(request.query)
+        if direct:
+            return SearchResponse(
+                success=True,
+                query=request.query,
+                summary=direct,
+                search_results={"source": "catalog_index"},
+                sources_count=0
+            )
+        
         # Init search agent if needed
         if search_agent is None:
             search_agent = SearchAgent(agent_config)
         
         # Search with agent
         search_prompt = f"Search for information about: {request.query}. Provide a comprehensive summary with key findings."
-        result = await search_agent.execute(search_prompt, use_tools=True)
+        context = catalog_index.context_for(request.query)
+        if context:
+            search_prompt = f"{context}\n\n{search_prompt}"
+        result = await search_agent.execute(search_prompt, use_tools=True, timeout=timeout)
         
         if result.success:
             return SearchResponse(
@@ -368,7 +1094,8 @@ async def search_and_summarize(request: SearchRequest):
                 query=request.query,
                 summary=result.content,
                 search_results=result.metadata,
-                sources_count=result.metadata.get("tools_used", 0)
+                sources_count=result.metadata.get("tools_used", 0),
+                model=result.metadata.get("model")
             )
         else:
             return SearchResponse(
@@ -390,6 +1117,41 @@ async def search_and_summarize(request: SearchRequest):
         )
 
 
+# Background search jobs
+async def run_search_job(job: dict, progress) -> dict:
+    # Same pipeline as POST /search, just off the request path and with the job deadline
+    request = SearchRequest(**job["params"])
+    timeout = search_jobs.job_timeout
+    if request.timeout_ms and request.timeout_ms > 0:
+        timeout = min(request.timeout_ms / 1000, timeout)
+    await progress("searching", 0.2)
+    response = await summarize_search(request, timeout)
+    return response.dict()
+
+
+def search_job_view(job: dict) -> SearchJob:
+    return SearchJob(query=job["params"]["query"], **{k: v for k, v in job.items() if k != "params"})
+
+
+@api_router.post("/search/jobs", response_model=SearchJob, status_code=202)
+async def create_search_job(request: SearchRequest):
+    # Returns immediately; collect the result from GET /search/jobs/{id}
+    try:
+        job = await search_jobs.submit(request.dict())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return search_job_view(job)
+
+
+@api_router.get("/search/jobs/{job_id}", response_model=SearchJob)
+async def get_search_job(job_id: str, wait: float = 0):
+    # wait > 0 long-polls up to that many seconds (max 30) for the job to finish
+    job = await search_jobs.get(job_id, wait=max(0.0, min(wait, 30.0)))
+    if not job:
+        raise HTTPException(status_code=404, detail="Search job not found")
+    return search_job_view(job)
+
+
 @api_router.get("/agents/capabilities")
 async def get_agent_capabilities():
     # Get agent capabilities
@@ -412,6 +1174,28 @@ async def get_agent_capabilities():
 # Include router
 app.include_router(api_router)
 
+# Compression is innermost so it sees the raw body; catalog bodies are memoized per version
+if os.getenv("COMPRESSION_ENABLED", "true").lower() == "true":
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "500")),
+        gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+        cache_paths=("/api/foodtruck", "/api/menu", "/api/locations", "/api/bootstrap"),
+    )
+
+# Rate limiting sits inside CORS so 429s still carry CORS headers
+# Off by default until TRUSTED_PROXIES is set, since behind an ingress every user would share the proxy's bucket
+rate_limit_backend = create_rate_limit_backend(db)
+RATE_LIMIT_DEFAULT = "true" if client_identity.trusted_proxies else "false"
+if os.getenv("RATE_LIMIT_ENABLED", RATE_LIMIT_DEFAULT).lower() == "true":
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=rate_limit_backend,
+        rules=default_rules(),
+        identity=client_identity,
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -420,18 +1204,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Logging config
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Request ids for log correlation; outermost so every layer's logs carry one
+app.add_middleware(RequestIdMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
     # Initialize agents on startup
-    global search_agent, chat_agent
+    global search_agent, chat_agent, snapshot_publisher, catalog_index_task, status_retention_task
+    # No-op on first start; resumes the log thread if a previous shutdown stopped it
+    log_listener.start()
     logger.info("Starting AI Agents API...")
+
+    # Explains for slow queries run on this loop through the same client
+    command_monitor.attach(client, asyncio.get_running_loop())
+
+    await change_broker.start()
+
+    # Delta sync: backfill updated_at on older documents, then index it
+    for name in SYNC_COLLECTIONS:
+        await db[name].update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": "$created_at"}}]
+        )
+        await db[name].create_index([("updated_at", 1), ("id", 1)])
+
+    # Status rollups: one document per client per bucket
+    for collection, _, _ in STATUS_ROLLUPS.values():
+        await db[collection].create_index([("bucket_start", 1), ("client_name", 1)], unique=True)
+    await db.status_clients.create_index("client_name", unique=True)
+
+    await search_jobs.start()
+    await idempotency_store.setup()
+
+    # Retention: TTL indexes plus hourly downsampling ahead of expiry
+    await status_retention.setup()
+    status_retention_task = asyncio.create_task(
+        status_retention.run_periodically(float(os.getenv("STATUS_ARCHIVE_INTERVAL_SECONDS", "600")))
+    )
+
+    if isinstance(rate_limit_backend, MongoBackend):
+        await rate_limit_backend.setup()
+
+    # Local catalog index, rebuilt periodically to catch other workers' writes
+    catalog_index_task = asyncio.create_task(
+        refresh_catalog_index_periodically(float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", "300")))
+    )
+
+    # Multi-worker mode: share one catalog snapshot instead of each worker querying Mongo
+    if snapshot_path:
+        snapshot_publisher = SnapshotPublisher(
+            Path(snapshot_path),
+            build_catalog_snapshot,
+            refresh_seconds=float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", "30")),
+        )
+        await snapshot_publisher.start()
     
     # Lazy agent init for faster startup
     logger.info("AI Agents API ready!")
@@ -447,5 +1273,15 @@ async def shutdown_db_client():
         # MCP cleanup automatic
         pass
     
+    await change_broker.stop()
+    await search_jobs.stop()
+    static_exporter.stop()
+    for task in (catalog_index_task, status_retention_task):
+        if task:
+            task.cancel()
+    if snapshot_publisher:
+        await snapshot_publisher.stop()
+    image_pipeline.shutdown()
     client.close()
     logger.info("AI Agents API shutdown complete.")
+    log_listener.stop()
@@ -0,0 +1,161 @@
+# Static, precompressed catalog export for serving reads straight from a file server or CDN
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone is still served everywhere
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# File suffix -> Content-Encoding the file server should send
+CONTENT_ENCODINGS = {"gz": "gzip", "br": "br"}
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_export(out_dir: Path, sections: Dict[str, bytes], keep_seconds: float = 3600) -> Dict[str, Any]:
+    # Blocking file and compression work; call from a thread
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for name, payload in sections.items():
+        digest = hashlib.sha256(payload).hexdigest()[:16]
+        base = f"{name}.{digest}.json"
+        entry = {"path": base, "sha256": digest, "bytes": len(payload), "encodings": {}}
+
+        variants = {base: payload}
+        # mtime=0 keeps gzip output byte-identical for identical input
+        variants[base + ".gz"] = gzip.compress(payload, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants[base + ".br"] = brotli.compress(payload, quality=11)
+
+        for filename, data in variants.items():
+            target = out_dir / filename
+            # Content-addressed: an existing file already holds these bytes, so it is only touched;
+            # mtime then marks the last export the file was live in, which is what _prune ages
+            if target.exists():
+                os.utime(target)
+            else:
+                _write_atomic(target, data)
+            if filename != base:
+                encoding = CONTENT_ENCODINGS[filename.rsplit(".", 1)[-1]]
+                entry["encodings"][encoding] = {"path": filename, "bytes": len(data)}
+        files[name] = entry
+
+    manifest = {"generated_at": datetime.utcnow().isoformat() + "Z", "files": files}
+    _write_atomic(out_dir / MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+    _prune(out_dir, manifest, keep_seconds)
+    return manifest
+
+
+def _prune(out_dir: Path, manifest: Dict[str, Any], keep_seconds: float):
+    # Older versions linger for keep_seconds after they were last live, so clients holding an old
+    # manifest can still fetch
+    live = {MANIFEST_NAME}
+    for entry in manifest["files"].values():
+        live.add(entry["path"])
+        live.update(encoding["path"] for encoding in entry["encodings"].values())
+    cutoff = time.time() - keep_seconds
+    for path in out_dir.iterdir():
+        if path.name in live or not path.is_file() or path.name.startswith("."):
+            continue
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+
+class StaticExporter:
+    # Renders the catalog payloads to out_dir; re-exports shortly after catalog writes
+
+    def __init__(
+        self,
+        out_dir: Path,
+        build: Callable[[], Awaitable[Dict[str, bytes]]],
+        debounce_seconds: float = 2.0,
+        keep_seconds: float = 3600,
+    ):
+        self.out_dir = Path(out_dir)
+        self.build = build
+        self.debounce_seconds = debounce_seconds
+        self.keep_seconds = keep_seconds
+        self.last_manifest: Optional[Dict[str, Any]] = None
+        self._pending: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._lock = asyncio.Lock()
+
+    async def export(self) -> Dict[str, Any]:
+        async with self._lock:
+            sections = await self.build()
+            manifest = await asyncio.to_thread(write_export, self.out_dir, sections, self.keep_seconds)
+        self.last_manifest = manifest
+        logger.info(f"Exported static catalog to {self.out_dir}")
+        return manifest
+
+    def mark_dirty(self):
+        # Coalesce bursts of writes into one export
+        self._dirty = True
+        if self._pending and not self._pending.done():
+            return
+        self._pending = asyncio.create_task(self._export_later())
+
+    async def _export_later(self):
+        while self._dirty:
+            await asyncio.sleep(self.debounce_seconds)
+            self._dirty = False
+            try:
+                await self.export()
+            except Exception as e:
+                logger.error(f"Static catalog export failed: {e}")
+
+    def stop(self):
+        if self._pending:
+            self._pending.cancel()
+
+
+def create_static_exporter(build, root_dir: Path) -> StaticExporter:
+    return StaticExporter(
+        Path(os.getenv("STATIC_EXPORT_DIR", str(root_dir / "static_export"))),
+        build,
+        debounce_seconds=float(os.getenv("STATIC_EXPORT_DEBOUNCE_SECONDS", "2")),
+        keep_seconds=float(os.getenv("STATIC_EXPORT_KEEP_SECONDS", "3600")),
+    )
+
+
+def main(out: Optional[Path] = None):
+    # CLI: python static_export.py [--out DIR]
+    from server import ROOT_DIR, build_catalog_snapshot, client
+
+    exporter = create_static_exporter(build_catalog_snapshot, ROOT_DIR)
+    if out:
+        exporter.out_dir = out
+
+    async def run():
+        try:
+            return await exporter.export()
+        finally:
+            client.close()
+
+    manifest = asyncio.run(run())
+    for name, entry in manifest["files"].items():
+        encodings = ", ".join(f"{enc} {info['bytes']}B" for enc, info in entry["encodings"].items())
+        print(f"{name}: {entry['path']} ({entry['bytes']}B; {encodings})")
+
+
+if __name__ == "__main__":
+    import typer
+
+    typer.run(main)
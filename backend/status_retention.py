@@ -0,0 +1,181 @@
+# Retention for status_checks: TTL expiry with hourly downsampling ahead of it
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TTL_INDEX_NAME = "timestamp_ttl"
+STATE_ID = "status_archive"
+
+
+class StatusRetention:
+    # Keeps raw heartbeats for retention_days; completed hours are folded into hourly rollups first
+
+    def __init__(
+        self,
+        db,
+        retention_days: float,
+        minute_rollup_days: float,
+        archive: bool = True,
+        archive_collection: str = "status_rollups_hour",
+        minute_collection: str = "status_rollups_minute",
+    ):
+        self.db = db
+        self.retention_days = retention_days
+        self.minute_rollup_days = minute_rollup_days
+        self.archive = archive
+        self.archive_collection = archive_collection
+        self.minute_collection = minute_collection
+        self.last_run: Optional[datetime] = None
+        self.last_archived_hours = 0
+
+    async def _ensure_ttl(self, collection: str, field: str, days: float):
+        # Create the TTL index, or retune it in place when the retention changes
+        seconds = int(days * 86400)
+        existing = {
+            name: spec for name, spec in (await self.db[collection].index_information()).items()
+            if spec["key"] == [(field, 1)]
+        }
+        for name, spec in existing.items():
+            if spec.get("expireAfterSeconds") == seconds:
+                return
+            if "expireAfterSeconds" in spec:
+                await self.db.command(
+                    "collMod", collection,
+                    index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+                )
+                logger.info(f"Retention for {collection} set to {days} days")
+                return
+            # A plain index on the field can't become TTL; replace it
+            await self.db[collection].drop_index(name)
+        await self.db[collection].create_index(field, name=TTL_INDEX_NAME, expireAfterSeconds=seconds)
+        logger.info(f"Retention for {collection} set to {days} days")
+
+    async def setup(self):
+        # With archiving on, the raw TTL waits for catch_up() so nothing expires un-downsampled
+        if self.retention_days > 0 and not self.archive:
+            await self._ensure_ttl("status_checks", "timestamp", self.retention_days)
+        if self.minute_rollup_days > 0:
+            await self._ensure_ttl(self.minute_collection, "bucket_start", self.minute_rollup_days)
+
+    async def archive_completed_hours(self, max_hours: int = 24 * 7) -> int:
+        # Downsample raw rows per client per hour, once per hour, long before TTL removes them
+        state = await self.db.maintenance_state.find_one({"_id": STATE_ID})
+        watermark = state["watermark"] if state else None
+        if watermark is None:
+            oldest = await self.db.status_checks.find_one({}, sort=[("timestamp", 1)])
+            if not oldest:
+                return 0
+            watermark = oldest["timestamp"].replace(minute=0, second=0, microsecond=0)
+
+        current_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        upto = min(current_hour, watermark + timedelta(hours=max_hours))
+        if upto <= watermark:
+            return 0
+
+        await self.db.status_checks.aggregate([
+            {"$match": {"timestamp": {"$gte": watermark, "$lt": upto}}},
+            {"$group": {
+                "_id": {
+                    "client_name": "$client_name",
+                    "bucket_start": {"$dateFromString": {"dateString": {
+                        "$dateToString": {"format": "%Y-%m-%dT%H:00:00Z", "date": "$timestamp"}
+                    }}},
+                },
+                "count": {"$sum": 1},
+            }},
+            {"$project": {
+                "_id": 0,
+                "client_name": "$_id.client_name",
+                "bucket_start": "$_id.bucket_start",
+                "count": 1,
+            }},
+            # Never lower a live rollup, e.g. if the oldest hour was already partly expired
+            {"$merge": {
+                "into": self.archive_collection,
+                "on": ["bucket_start", "client_name"],
+                "whenMatched": [{"$set": {"count": {"$max": ["$count", "$$new.count"]}}}],
+                "whenNotMatched": "insert",
+            }},
+        ]).to_list(None)
+
+        await self.db.maintenance_state.update_one(
+            {"_id": STATE_ID}, {"$set": {"watermark": upto, "updated_at": datetime.utcnow()}}, upsert=True
+        )
+        hours = int((upto - watermark) / timedelta(hours=1))
+        self.last_archived_hours = hours
+        return hours
+
+    async def catch_up(self) -> int:
+        # Archive chunk after chunk until the watermark reaches the current hour
+        total = 0
+        while True:
+            hours = await self.archive_completed_hours()
+            if not hours:
+                return total
+            total += hours
+
+    async def run_periodically(self, interval: float):
+        while True:
+            try:
+                if self.archive:
+                    hours = await self.catch_up()
+                    if hours:
+                        logger.info(f"Archived {hours} hours of status checks")
+                    # Everything older than the cutoff is now downsampled; safe to create or tighten the TTL
+                    if self.retention_days > 0:
+                        await self._ensure_ttl("status_checks", "timestamp", self.retention_days)
+                self.last_run = datetime.utcnow()
+            except Exception as e:
+                logger.error(f"Status archive run failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def report(self) -> Dict[str, Any]:
+        stats, oldest, newest, state, indexes = await asyncio.gather(
+            self.db.command("collStats", "status_checks"),
+            self.db.status_checks.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)]),
+            self.db.status_checks.find_one({}, {"timestamp": 1}, sort=[("timestamp", -1)]),
+            self.db.maintenance_state.find_one({"_id": STATE_ID}),
+            self.db.status_checks.index_information(),
+        )
+        ttl = next(
+            (spec.get("expireAfterSeconds") for spec in indexes.values()
+             if spec["key"] == [("timestamp", 1)] and "expireAfterSeconds" in spec),
+            None,
+        )
+        return {
+            "collection": {
+                "count": stats.get("count", 0),
+                "size_bytes": stats.get("size", 0),
+                "storage_bytes": stats.get("storageSize", 0),
+                "index_bytes": stats.get("totalIndexSize", 0),
+            },
+            "retention": {
+                "configured_days": self.retention_days,
+                "ttl_seconds": ttl,
+                "minute_rollup_days": self.minute_rollup_days,
+                "oldest": oldest["timestamp"] if oldest else None,
+                "newest": newest["timestamp"] if newest else None,
+            },
+            "archive": {
+                "enabled": self.archive,
+                "collection": self.archive_collection,
+                "watermark": state["watermark"] if state else None,
+                "last_run": self.last_run,
+                "last_archived_hours": self.last_archived_hours,
+            },
+        }
+
+
+def create_status_retention(db) -> StatusRetention:
+    return StatusRetention(
+        db,
+        # Off unless configured: turning it on deletes raw heartbeats
+        retention_days=float(os.getenv("STATUS_RETENTION_DAYS", "0")),
+        minute_rollup_days=float(os.getenv("STATUS_MINUTE_ROLLUP_RETENTION_DAYS", "7")),
+        archive=os.getenv("STATUS_ARCHIVE_ENABLED", "true").lower() == "true",
+    )
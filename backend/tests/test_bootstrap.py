@@ -0,0 +1,98 @@
+# /api/bootstrap: field projection, validators and snapshot stitching
+
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+import server
+from catalog_snapshot import CatalogSnapshot, SnapshotPublisher
+
+
+def bootstrap_client(monkeypatch, seed=True) -> TestClient:
+    catalog = AsyncMongoMockClient()["bootstrap_test"]
+    monkeypatch.setattr(server, "catalog_db", catalog)
+    monkeypatch.setattr(server, "db", catalog)
+    monkeypatch.setattr(server, "catalog_snapshot", None)
+
+    async def insert():
+        await catalog.food_truck_info.insert_one(server.FoodTruckInfo(
+            name="Truck", description="Street food", phone="1", social_media={"instagram": "@truck"},
+        ).dict())
+        await catalog.menu_items.insert_one(server.MenuItem(
+            name="Taco", description="Crispy", price=3, category="Tacos", image_url="/api/images/x",
+        ).dict())
+
+    if seed:
+        asyncio.run(insert())
+    return TestClient(server.app)
+
+
+def test_full_payload(monkeypatch):
+    body = bootstrap_client(monkeypatch).get("/api/bootstrap").json()
+    assert body["foodtruck"]["social_media"] == {"instagram": "@truck"}
+    assert body["menu"][0]["description"] == "Crispy" and body["menu"][0]["image_url"] == "/api/images/x"
+    # Locations fall back to the sample list
+    assert [loc["id"] for loc in body["locations"]] == ["sample-downtown-plaza", "sample-business-district"]
+
+
+def test_lite_and_exclude_drop_heavy_fields(monkeypatch):
+    client = bootstrap_client(monkeypatch)
+    lite = client.get("/api/bootstrap", params={"lite": "true"}).json()
+    assert not set(server.HEAVY_FIELDS) & set(lite["foodtruck"])
+    assert not set(server.HEAVY_FIELDS) & set(lite["menu"][0])
+    assert lite["menu"][0]["name"] == "Taco"
+
+    partial = client.get("/api/bootstrap", params={"exclude": "description, image_url"}).json()
+    assert "description" not in partial["menu"][0] and "image_url" not in partial["menu"][0]
+    assert partial["foodtruck"]["social_media"] == {"instagram": "@truck"}
+
+
+def test_unknown_exclude_field_is_rejected(monkeypatch):
+    response = bootstrap_client(monkeypatch).get("/api/bootstrap", params={"exclude": "price,name"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot exclude fields: price, name"
+
+
+def test_etag_revalidation(monkeypatch):
+    client = bootstrap_client(monkeypatch)
+    first = client.get("/api/bootstrap", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == f"public, max-age={server.BOOTSTRAP_MAX_AGE}"
+    again = client.get("/api/bootstrap", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    lite = client.get("/api/bootstrap", params={"lite": "true"}, headers={"If-None-Match": etag})
+    assert lite.status_code == 200
+
+
+def test_empty_catalog_fallback_is_stable(monkeypatch):
+    client = bootstrap_client(monkeypatch, seed=False)
+    first = client.get("/api/bootstrap", headers={"Accept-Encoding": "identity"})
+    second = client.get("/api/bootstrap", headers={"Accept-Encoding": "identity"})
+    assert first.content == second.content
+    again = client.get("/api/bootstrap", headers={"Accept-Encoding": "identity", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_snapshot_sections_are_stitched(monkeypatch, tmp_path):
+    client = bootstrap_client(monkeypatch)
+    from_db = client.get("/api/bootstrap").json()
+
+    path = tmp_path / "catalog.snap"
+    SnapshotPublisher(path, build=None)._write(asyncio.run(server.build_catalog_snapshot()))
+    # Mongo is never consulted once every section is in the snapshot
+    monkeypatch.setattr(server, "catalog_db", None)
+    monkeypatch.setattr(server, "catalog_snapshot", CatalogSnapshot(path, check_interval=0))
+
+    response = client.get("/api/bootstrap")
+    assert response.status_code == 200
+    assert json.loads(response.content) == from_db
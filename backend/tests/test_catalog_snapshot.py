@@ -0,0 +1,88 @@
+# Catalog snapshot format, mmap reader and publisher
+
+import asyncio
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+from catalog_snapshot import HEADER, CatalogSnapshot, SnapshotPublisher, pack_snapshot, unpack_index
+
+
+def test_pack_unpack_round_trip():
+    sections = {"menu": b"[1,2]", "locations": b"[]", "foodtruck": b'{"name":"x"}'}
+    data = pack_snapshot(7, sections)
+    version, index = unpack_index(data)
+    assert version == 7
+    for name, payload in sections.items():
+        offset, length = index[name]
+        assert data[offset:offset + length] == payload
+
+
+def test_unpack_rejects_foreign_files():
+    with pytest.raises(ValueError):
+        unpack_index(b"XXXX" + b"\0" * (HEADER.size - 4))
+    with pytest.raises(struct.error):
+        unpack_index(b"FTC1")
+
+
+def test_reader_picks_up_new_versions(tmp_path):
+    path = tmp_path / "catalog.snap"
+    reader = CatalogSnapshot(path, check_interval=0)
+    assert reader.section("menu") is None
+
+    publisher = SnapshotPublisher(path, build=None)
+    assert publisher._write({"menu": b"[1]"}) == 1
+    first = reader.section("menu")
+    assert bytes(first) == b"[1]" and reader.version == 1
+
+    assert publisher._write({"menu": b"[1,2]"}) == 2
+    assert bytes(reader.section("menu")) == b"[1,2]" and reader.version == 2
+    # Views handed out earlier keep reading the old mapping
+    assert bytes(first) == b"[1]"
+    assert reader.section("missing") is None
+
+
+def test_mark_dirty_coalesces_writes(tmp_path):
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {"menu": b"[]"}
+
+    async def run():
+        publisher = SnapshotPublisher(tmp_path / "catalog.snap", build, debounce_seconds=0.01)
+        for _ in range(5):
+            publisher.mark_dirty()
+        await publisher._pending
+        await publisher.stop()
+
+    asyncio.run(run())
+    assert len(builds) == 1
+
+
+def test_snapshot_built_from_primary(monkeypatch):
+    import server
+
+    primary = AsyncMongoMockClient()["primary"]
+    # Stands in for a lagging secondary that hasn't seen the write yet
+    secondary = AsyncMongoMockClient()["secondary"]
+    monkeypatch.setattr(server, "db", primary)
+    monkeypatch.setattr(server, "catalog_db", secondary)
+
+    async def run():
+        item = server.MenuItem(name="Fresh Item", description="", price=3.5, category="Sides")
+        await primary.menu_items.insert_one(item.dict())
+        return await server.build_catalog_snapshot()
+
+    sections = asyncio.run(run())
+    assert [item["name"] for item in json.loads(sections["menu"])] == ["Fresh Item"]
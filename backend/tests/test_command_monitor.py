@@ -0,0 +1,83 @@
+# Command monitor: histograms, slow log grouping and tailable cursors
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from command_monitor import CommandMonitor, explain_target, query_shape, summarize_plan
+
+CONNECTION = ("localhost", 27017)
+
+
+def run_command(monitor, request_id, command, micros, reply=None, failed=False):
+    name = next(iter(command))
+    monitor.started(SimpleNamespace(
+        command_name=name, command=command, request_id=request_id,
+        connection_id=CONNECTION, database_name="test",
+    ))
+    event = SimpleNamespace(
+        command_name=name, request_id=request_id, connection_id=CONNECTION,
+        duration_micros=micros, reply=reply or {},
+    )
+    (monitor.failed if failed else monitor.succeeded)(event)
+
+
+def test_histograms_and_slow_log_grouped_by_shape():
+    monitor = CommandMonitor(slow_ms=50, explain=False)
+    for i, (value, micros) in enumerate([("a", 2000), ("b", 80000), ("c", 120000)]):
+        run_command(monitor, i, {"find": "menu_items", "filter": {"id": value}, "lsid": {}}, micros)
+    run_command(monitor, 9, {"ping": 1}, 500_000)
+
+    [row] = monitor.stats()
+    assert (row["collection"], row["command"], row["count"]) == ("menu_items", "find", 3)
+    assert row["max_ms"] == 120.0 and row["p50_ms"] == 100
+
+    [offender] = monitor.top_slow()
+    assert offender["shape"] == "{id}"
+    assert offender["count"] == 2 and offender["total_ms"] == 200.0
+
+
+def test_tailable_getmores_are_not_slow_queries():
+    monitor = CommandMonitor(slow_ms=50, explain=False)
+    run_command(
+        monitor, 1, {"find": "change_feed", "filter": {}, "tailable": True, "awaitData": True}, 1000,
+        reply={"cursor": {"id": 42, "firstBatch": []}},
+    )
+    for i in range(5):
+        run_command(monitor, 10 + i, {"getMore": 42, "collection": "change_feed"}, 1_000_000,
+                    reply={"cursor": {"id": 42, "nextBatch": []}})
+    assert monitor.top_slow() == []
+    assert [row["command"] for row in monitor.stats()] == ["find"]
+
+    # Once the cursor is exhausted its id is forgotten
+    run_command(monitor, 20, {"getMore": 42, "collection": "change_feed"}, 1000, reply={"cursor": {"id": 0}})
+    assert 42 not in monitor._tailable_cursors
+
+    # getMores on ordinary cursors are still measured
+    run_command(monitor, 21, {"getMore": 7, "collection": "menu_items"}, 200_000)
+    assert [row["command"] for row in monitor.top_slow()] == ["getMore"]
+
+
+def test_query_shape_drops_values():
+    command = {"find": "locations", "filter": {"deleted_at": None, "updated_at": {"$gt": 1}}, "sort": {"updated_at": 1}}
+    assert query_shape("find", command) == "{deleted_at,updated_at:$gt} sort{updated_at}"
+    assert query_shape("delete", {"delete": "x", "deletes": [{"q": {"id": "1"}, "limit": 1}]}) == "{id}"
+    assert query_shape("aggregate", {"pipeline": [{"$match": {"a": 1}}, {"$group": {}}]}) == "$match{a} $group"
+
+
+def test_explain_target_strips_session_fields():
+    command = {
+        "update": "menu_items", "updates": [{"q": {"id": "1"}}, {"q": {"id": "2"}}],
+        "lsid": {}, "$db": "test", "txnNumber": 3,
+    }
+    assert explain_target("update", command) == {"update": "menu_items", "updates": [{"q": {"id": "1"}}]}
+
+
+def test_summarize_plan_flags_collscan():
+    nested = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}}]}
+    assert summarize_plan(nested)["collscan"]
+    indexed = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "id_1"}}}}
+    assert summarize_plan(indexed) == {"stages": ["FETCH", "IXSCAN"], "indexes": ["id_1"], "collscan": False}
@@ -0,0 +1,135 @@
+# Response compression: negotiation, streaming, memoized bodies and per-encoding validators
+
+import asyncio
+import gzip
+import os
+import sys
+import zlib
+from pathlib import Path
+
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+import compression
+from compression import (
+    CompressionMiddleware, choose_encoding, encoded_etag, etag_matches, parse_accept_encoding,
+)
+
+BODY = b'{"items":"' + b"x" * 2000 + b'"}'
+
+
+def json_app(body=BODY, headers=()):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            + list(headers),
+        })
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+async def streaming_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    for i in range(3):
+        await send({"type": "http.response.body", "body": f"chunk {i} ".encode() * 20, "more_body": i < 2})
+
+
+def request(middleware, path="/api/menu", accept="gzip"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"]), messages[1:]
+
+
+def test_parse_and_choose_encoding(monkeypatch):
+    assert parse_accept_encoding("br;q=1.0, gzip;q=0.8, *;q=0") == {"br": 1.0, "gzip": 0.8, "*": 0.0}
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+
+
+def test_compresses_and_sets_vary():
+    headers, body = request(CompressionMiddleware(json_app(headers=[(b"vary", b"Origin")])))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Origin, Accept-Encoding"
+    assert gzip.decompress(body[0]["body"]) == BODY
+    assert int(headers[b"content-length"]) == len(body[0]["body"])
+
+
+def test_small_and_non_text_bodies_pass_through():
+    headers, body = request(CompressionMiddleware(json_app(body=b"{}")))
+    assert b"content-encoding" not in headers and body[0]["body"] == b"{}"
+
+
+def test_memoized_per_path_and_version():
+    middleware = CompressionMiddleware(json_app(headers=[(b"etag", b'"v1"')]), cache_paths=["/api/menu"])
+    first = request(middleware)[1][0]["body"]
+    second = request(middleware)[1][0]["body"]
+    assert first == second
+    assert middleware.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    request(middleware, path="/api/other")
+    assert middleware.stats()["entries"] == 1
+
+
+def test_streaming_stays_incremental():
+    headers, chunks = request(CompressionMiddleware(streaming_app))
+    assert b"content-length" not in headers
+    assert [c["more_body"] for c in chunks] == [True, True, False]
+    # Each flushed chunk decodes on its own, so clients see data as it arrives
+    decoder = zlib.decompressobj(31)
+    assert decoder.decompress(chunks[0]["body"]).startswith(b"chunk 0")
+    assert zlib.decompress(b"".join(c["body"] for c in chunks), 31).endswith(b"chunk 2 ")
+
+
+def test_encoded_responses_get_their_own_etag():
+    headers, _ = request(CompressionMiddleware(json_app(headers=[(b"etag", b'"abc"')])))
+    assert headers[b"etag"] == b'"abc-gzip"'
+    identity, _ = request(CompressionMiddleware(json_app(headers=[(b"etag", b'"abc"')])), accept="identity")
+    assert identity[b"etag"] == b'"abc"'
+    assert encoded_etag(b'W/"abc"', "br") == b'W/"abc-br"'
+
+
+def test_etag_matches_any_variant():
+    assert etag_matches('"abc"', '"abc"') == '"abc"'
+    assert etag_matches('"zzz", "abc-gzip"', '"abc"') == '"abc-gzip"'
+    assert etag_matches('W/"abc-br"', '"abc"') == 'W/"abc-br"'
+    assert etag_matches('"abc-deflate"', '"abc"') is None
+    assert etag_matches(None, '"abc"') is None
+
+
+def test_bootstrap_revalidates_gzip_etag(monkeypatch):
+    import server
+    from fastapi.testclient import TestClient
+
+    catalog = AsyncMongoMockClient()["bootstrap_test"]
+    monkeypatch.setattr(server, "catalog_db", catalog)
+    monkeypatch.setattr(server, "db", catalog)
+    client = TestClient(server.app)
+
+    # Stored documents with a truck description long enough to be worth compressing
+    async def seed():
+        await catalog.food_truck_info.insert_one(server.FoodTruckInfo(name="Truck", description="d" * 600, phone="1").dict())
+        await catalog.menu_items.insert_one(server.MenuItem(name="Taco", description="", price=3, category="Tacos").dict())
+        await catalog.locations.insert_one(server.Location(name="Plaza", address="1 Main St", latitude=1.0, longitude=2.0).dict())
+
+    asyncio.run(seed())
+
+    first = client.get("/api/bootstrap", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.endswith('-gzip"')
+    again = client.get("/api/bootstrap", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
@@ -0,0 +1,122 @@
+# Catalog circuit breaker and connection pool monitor
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import AutoReconnect
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+from database import CircuitBreaker, CircuitOpenError, PoolMonitor
+
+
+async def ok():
+    return ["menu"]
+
+
+async def down():
+    raise AutoReconnect("primary unreachable")
+
+
+def test_opens_after_threshold_and_serves_cache():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    calls = []
+
+    async def counted_down():
+        calls.append(1)
+        await down()
+
+    async def run():
+        assert await breaker.call("menu", ok) == ["menu"]
+        assert await breaker.call("menu", counted_down) == ["menu"]
+        assert breaker.state == "closed"
+        assert await breaker.call("menu", counted_down) == ["menu"]
+        assert breaker.state == "open"
+        # Open: the loader isn't even tried
+        assert await breaker.call("menu", counted_down) == ["menu"]
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_open_without_cache_raises():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call("locations", down))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call("locations", ok))
+
+
+def test_catalog_read_maps_open_circuit_to_503(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "catalog_breaker", CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.catalog_read(("menu",), down))
+    assert error.value.status_code == 503 and error.value.headers["Retry-After"] == "5"
+
+
+def test_half_open_lets_one_trial_through_then_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    trials = []
+
+    async def slow_recovery():
+        trials.append(1)
+        await asyncio.sleep(0.05)
+        return ["fresh"]
+
+    async def run():
+        await breaker.call("menu", ok)
+        await breaker.call("menu", down)
+        assert breaker.state == "open"
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        results = await asyncio.gather(*[breaker.call("menu", slow_recovery) for _ in range(5)])
+        return results
+
+    results = asyncio.run(run())
+    # One probe hit the database; the rest were served the cached result meanwhile
+    assert len(trials) == 1
+    assert results.count(["fresh"]) == 1 and results.count(["menu"]) == 4
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.01)
+    breaker.opened_at = 0.0
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call("menu", down))
+    assert breaker.state == "open" and not breaker._probing
+
+
+def pool_event(host="db1"):
+    return SimpleNamespace(address=(host, 27017))
+
+
+def test_pool_monitor_saturation():
+    monitor = PoolMonitor(max_pool_size=2)
+    for _ in range(2):
+        monitor.connection_check_out_started(pool_event())
+        monitor.connection_checked_out(pool_event())
+    assert not monitor.saturated()
+
+    # Pool full and someone is queued behind it
+    monitor.connection_check_out_started(pool_event())
+    assert monitor.saturated()
+    assert monitor.stats()["servers"]["db1:27017"] == {"in_use": 2, "waiting": 1, "saturation": 1.0}
+
+    monitor.connection_check_out_failed(pool_event())
+    assert not monitor.saturated() and monitor.checkout_failures == 1
+
+    monitor.connection_checked_in(pool_event())
+    monitor.pool_closed(pool_event())
+    assert monitor.stats()["servers"] == {}
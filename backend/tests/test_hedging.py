@@ -0,0 +1,78 @@
+# Hedged model calls, failover and deadlines, with the LLM calls stubbed out
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from ai_agents.agents import AgentConfig, ChatAgent, ModelRoute
+
+
+def make_agent(behaviour, route=None, timeout=5.0):
+    # behaviour: model name -> (delay seconds, error or None)
+    config = AgentConfig(
+        api_base_url="http://localhost:4000",
+        model_name="primary",
+        api_key="test",
+        timeout_seconds=timeout,
+        model_routes={"chat": route or ModelRoute(primary="primary", fallback="fallback", hedge_after_seconds=0.05)},
+    )
+    agent = ChatAgent(config)
+    calls = []
+
+    async def fake_invoke(model_name, messages, use_tools):
+        calls.append(model_name)
+        delay, error = behaviour[model_name]
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return model_name, SimpleNamespace(content=f"answer from {model_name}")
+
+    agent._invoke = fake_invoke
+    return agent, calls
+
+
+def test_fast_primary_is_not_hedged():
+    agent, calls = make_agent({"primary": (0.0, None), "fallback": (0.0, None)})
+    response = asyncio.run(agent.execute("hi"))
+    assert response.success and response.metadata["model"] == "primary"
+    assert response.metadata["hedged"] is False
+    assert calls == ["primary"]
+
+
+def test_slow_primary_hedges_and_fastest_answer_wins():
+    agent, calls = make_agent({"primary": (1.0, None), "fallback": (0.01, None)})
+    response = asyncio.run(agent.execute("hi"))
+    assert response.content == "answer from fallback"
+    assert response.metadata["hedged"] is True
+    assert calls == ["primary", "fallback"]
+
+
+def test_failed_primary_fails_over_before_hedge_delay():
+    route = ModelRoute(primary="primary", fallback="fallback", hedge_after_seconds=10)
+    agent, calls = make_agent({"primary": (0.0, RuntimeError("503")), "fallback": (0.0, None)}, route)
+    response = asyncio.run(agent.execute("hi"))
+    assert response.success and response.metadata["model"] == "fallback"
+
+
+def test_both_models_failing_reports_the_error():
+    agent, _ = make_agent({"primary": (0.0, RuntimeError("down")), "fallback": (0.0, RuntimeError("also down"))})
+    response = asyncio.run(agent.execute("hi"))
+    assert not response.success and response.error == "also down"
+
+
+def test_deadline_cancels_both_calls():
+    agent, calls = make_agent({"primary": (5.0, None), "fallback": (5.0, None)})
+    response = asyncio.run(agent.execute("hi", timeout=0.2))
+    assert not response.success
+    assert response.metadata["timed_out"] is True
+    assert calls == ["primary", "fallback"]
+
+
+def test_without_fallback_only_primary_runs():
+    agent, calls = make_agent({"primary": (0.1, None)}, ModelRoute(primary="primary"))
+    assert asyncio.run(agent.execute("hi")).metadata["hedged"] is False
+    assert calls == ["primary"]
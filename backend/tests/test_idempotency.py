@@ -0,0 +1,139 @@
+# Idempotency-Key store: replay, key reuse and per-client scoping
+
+import asyncio
+import os
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+from idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+
+
+def make_store() -> IdempotencyStore:
+    collection = AsyncMongoMockClient()["idem_test"]["idempotency_keys"]
+    return IdempotencyStore(collection, ttl=timedelta(hours=1), lock_timeout=timedelta(seconds=60), wait_seconds=0.2)
+
+
+def counting_handler(calls):
+    async def handler():
+        calls.append(1)
+        return {"id": f"created-{len(calls)}"}
+    return handler
+
+
+def test_retry_replays_first_response():
+    store, calls = make_store(), []
+
+    async def run():
+        first = await store.run("POST /status", "anonymous", "k1", {"a": 1}, counting_handler(calls))
+        second = await store.run("POST /status", "anonymous", "k1", {"a": 1}, counting_handler(calls))
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ({"id": "created-1"}, False)
+    assert second == ({"id": "created-1"}, True)
+    assert len(calls) == 1
+
+
+def test_same_key_from_another_client_is_not_replayed():
+    store, calls = make_store(), []
+
+    async def run():
+        payload = {"client_name": "kiosk"}
+        first = await store.run("POST /status", "key:1111|client:kiosk", "boot", payload, counting_handler(calls))
+        second = await store.run("POST /status", "key:2222|client:kiosk", "boot", payload, counting_handler(calls))
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not first[1] and not second[1]
+    assert len(calls) == 2
+
+
+def test_key_reuse_with_different_body_is_rejected():
+    store = make_store()
+
+    async def run():
+        await store.run("POST /menu", "anonymous", "k", {"name": "a"}, counting_handler([]))
+        await store.run("POST /menu", "anonymous", "k", {"name": "b"}, counting_handler([]))
+
+    with pytest.raises(IdempotencyConflict) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 422
+
+
+def test_failed_handler_releases_the_key():
+    store, calls = make_store(), []
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await store.run("POST /menu", "anonymous", "k", {}, failing)
+        return await store.run("POST /menu", "anonymous", "k", {}, counting_handler(calls))
+
+    assert asyncio.run(run()) == ({"id": "created-1"}, False)
+
+
+def test_in_flight_duplicate_gets_409():
+    store = make_store()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"id": "x"}
+
+        first = asyncio.create_task(store.run("POST /menu", "anonymous", "k", {}, slow))
+        await asyncio.sleep(0.01)
+        try:
+            await store.run("POST /menu", "anonymous", "k", {}, slow)
+        finally:
+            release.set()
+            await first
+
+    with pytest.raises(IdempotencyConflict) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 409
+
+
+def test_overlong_key_rejected():
+    with pytest.raises(IdempotencyConflict) as error:
+        asyncio.run(make_store().run("POST /menu", "anonymous", "k" * 300, {}, counting_handler([])))
+    assert error.value.status_code == 400
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+
+
+def test_retry_from_a_new_network_is_replayed(monkeypatch):
+    import server
+    from fastapi import Request, Response
+
+    store, calls = make_store(), []
+    monkeypatch.setattr(server, "idempotency_store", store)
+
+    def request_from(ip: str) -> Request:
+        headers = [(b"idempotency-key", b"k1"), (b"x-client-name", b"phone")]
+        return Request({"type": "http", "method": "POST", "path": "/api/status", "client": (ip, 443), "headers": headers})
+
+    async def run():
+        # Same phone: first attempt over Wi-Fi, retry after switching to cellular
+        first = await server.idempotent(request_from("203.0.113.7"), Response(), "POST /status", "k1", {}, counting_handler(calls))
+        replay = Response()
+        second = await server.idempotent(request_from("198.51.100.4"), replay, "POST /status", "k1", {}, counting_handler(calls))
+        return first, second, replay
+
+    first, second, replay = asyncio.run(run())
+    assert first == second and len(calls) == 1
+    assert replay.headers["Idempotent-Replayed"] == "true"
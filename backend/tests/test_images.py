@@ -0,0 +1,123 @@
+# Image pipeline: variants, content-hash keys, formats, orientation and oversized uploads
+
+import asyncio
+import io
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from images import KEY_PATTERN, ImagePipeline, LocalBlobStore, render_variants
+
+
+def png_bytes(size=(1200, 600), mode="RGB") -> bytes:
+    return image_bytes("PNG", size, mode)
+
+
+def image_bytes(fmt: str, size=(1200, 600), mode="RGB", **params) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def bomb_png(width: int, height: int) -> bytes:
+    # 1-bit image of zeros: tiny on disk, width x height pixels once decoded
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    row = b"\x00" * (1 + (width + 7) // 8)
+    compressor = zlib.compressobj(9)
+    idat = b"".join(compressor.compress(row) for _ in range(height)) + compressor.flush()
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", idat) + chunk(b"IEND", b"")
+
+
+def make_pipeline(tmp_path, max_pixels=25_000_000) -> ImagePipeline:
+    return ImagePipeline(LocalBlobStore(tmp_path), "/api/images", max_bytes=1024 * 1024, workers=1, max_pixels=max_pixels)
+
+
+def test_render_variants_sizes_and_keys():
+    blobs = render_variants(png_bytes(), "a" * 32, max_pixels=10_000_000)
+    assert set(blobs) == {
+        f"{'a' * 32}_original.png",
+        f"{'a' * 32}_thumb.jpg", f"{'a' * 32}_thumb.webp",
+        f"{'a' * 32}_medium.jpg", f"{'a' * 32}_medium.webp",
+    }
+    assert all(KEY_PATTERN.match(key) for key in blobs)
+    with Image.open(io.BytesIO(blobs[f"{'a' * 32}_medium.webp"])) as medium:
+        assert medium.size == (800, 400)
+
+
+def test_transparent_images_keep_alpha():
+    blobs = render_variants(png_bytes((300, 300), "RGBA"), "b" * 32, max_pixels=10_000_000)
+    assert f"{'b' * 32}_thumb.png" in blobs
+
+
+def test_pixel_limit_checked_before_decoding():
+    with pytest.raises(ValueError, match="limit is 1000 pixels"):
+        render_variants(png_bytes((100, 100)), "c" * 32, max_pixels=1000)
+
+
+def test_ingest_maps_oversized_images_to_value_error(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    try:
+        with pytest.raises(ValueError):
+            # Past Pillow's own bomb threshold: raises DecompressionBombError while opening
+            asyncio.run(pipeline.ingest(bomb_png(20000, 20000)))
+        with pytest.raises(ValueError, match="limit"):
+            asyncio.run(pipeline.ingest(bomb_png(6000, 6000)))
+    finally:
+        pipeline.shutdown()
+
+
+def test_ingest_stores_variants_once(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    try:
+        data = png_bytes()
+        first = asyncio.run(pipeline.ingest(data))
+        second = asyncio.run(pipeline.ingest(data))
+    finally:
+        pipeline.shutdown()
+    assert first == second
+    assert first["url"].startswith("/api/images/") and first["url"].endswith("_original.png")
+    assert set(first["variants"]) == {"thumb_jpg", "thumb_webp", "medium_jpg", "medium_webp"}
+    assert len(list(tmp_path.iterdir())) == 5
+
+
+def test_rejects_non_images(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    try:
+        with pytest.raises(ValueError, match="Unsupported image"):
+            asyncio.run(pipeline.ingest(b"not an image"))
+    finally:
+        pipeline.shutdown()
+
+
+def test_formats_outside_the_allow_list_are_rejected():
+    for fmt in ("TIFF", "BMP"):
+        with pytest.raises(ValueError, match="Unsupported image format"):
+            render_variants(image_bytes(fmt, (50, 50)), "d" * 32, max_pixels=10_000_000)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 CW to display, as phones write portrait shots
+    landscape_on_disk = image_bytes("JPEG", (1200, 600), exif=exif.tobytes())
+    blobs = render_variants(landscape_on_disk, "e" * 32, max_pixels=10_000_000)
+    with Image.open(io.BytesIO(blobs[f"{'e' * 32}_medium.jpg"])) as medium:
+        assert medium.size == (400, 800)
+    assert f"{'e' * 32}_original.jpg" in blobs
+
+
+def test_pool_does_not_fork_the_server(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    try:
+        assert pipeline.executor._mp_context.get_start_method() == "forkserver"
+    finally:
+        pipeline.shutdown()
@@ -0,0 +1,56 @@
+# Queue-based logging: JSON output, sampling and listener lifecycle
+
+import json
+import logging
+import queue
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from logging_setup import AsyncQueueHandler, JsonFormatter, QueueListener, SamplingFilter, parse_sample_rates, request_id_var
+
+
+def record(name="app", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    rec = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    rec.__dict__.update(extra)
+    return rec
+
+
+def test_json_formatter_includes_extras_and_request_id():
+    line = json.loads(JsonFormatter().format(record(request_id="r1", duration_ms=12)))
+    assert line["message"] == "hello world"
+    assert line["request_id"] == "r1" and line["duration_ms"] == 12
+
+
+def test_sampling_keeps_warnings_and_unlisted_loggers():
+    sampler = SamplingFilter({"noisy": 0.0})
+    assert not sampler.filter(record(name="noisy.child"))
+    assert sampler.filter(record(name="noisy", level=logging.WARNING))
+    assert sampler.filter(record(name="quiet"))
+    assert parse_sample_rates("a=0.1, b.c=1") == {"a": 0.1, "b.c": 1.0}
+
+
+def test_queue_handler_stamps_request_id_and_sheds_load():
+    handler = AsyncQueueHandler(queue.Queue(maxsize=1))
+    token = request_id_var.set("req-7")
+    try:
+        handler.emit(record())
+        handler.emit(record())
+    finally:
+        request_id_var.reset(token)
+    queued = handler.queue.get_nowait()
+    assert queued.request_id == "req-7" and queued.msg == "hello world" and queued.args is None
+    assert handler.dropped == 1
+
+
+def test_listener_stop_and_start_are_repeatable():
+    listener = QueueListener(queue.Queue(), logging.NullHandler())
+    listener.start()
+    listener.start()
+    listener.stop()
+    listener.stop()
+    # A second lifespan cycle in the same process
+    listener.start()
+    listener.stop()
@@ -0,0 +1,126 @@
+# Token buckets and client identity for the rate limiter
+
+import asyncio
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from rate_limit import Budget, ClientIdentity, InMemoryBackend, RateLimitMiddleware, Rule
+
+
+def http_scope(path="/api/chat", method="POST", client=("203.0.113.7", 5000), headers=()):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "client": client,
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+
+
+async def call(middleware, scope):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, None, send)
+    return messages[0]["status"]
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def test_budget_parse():
+    budget = Budget.parse("ai", "10/60")
+    assert (budget.capacity, budget.period) == (10, 60.0)
+    assert budget.rate == 10 / 60
+
+
+def test_in_memory_bucket_drains_and_reports_retry():
+    backend = InMemoryBackend()
+    budget = Budget("ai", 2, 60)
+
+    async def run():
+        return [await backend.take("ip:a", budget) for _ in range(3)]
+
+    first, second, third = asyncio.run(run())
+    assert first[:2] == (True, 1)
+    assert second[:2] == (True, 0)
+    assert third[0] is False
+    assert 25 < third[2] <= 30
+
+
+def test_in_memory_backend_is_lru_bounded():
+    backend = InMemoryBackend(max_keys=2)
+    budget = Budget("read", 5, 60)
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await backend.take(key, budget)
+
+    asyncio.run(run())
+    assert list(backend.buckets) == ["b", "c"]
+
+
+def test_rotating_client_name_does_not_escape_the_limit():
+    middleware = RateLimitMiddleware(ok_app, InMemoryBackend(), [Rule("/api/chat", Budget("ai", 3, 60))])
+
+    async def run():
+        return [
+            await call(middleware, http_scope(headers=[("x-client-name", f"device-{i}"), ("x-api-key", f"k{i}")]))
+            for i in range(5)
+        ]
+
+    assert asyncio.run(run()) == [200, 200, 200, 429, 429]
+
+
+def test_forwarded_for_only_believed_from_trusted_proxies():
+    identity = ClientIdentity(trusted_proxies=["10.0.0.0/8"])
+    spoofed = http_scope(headers=[("x-forwarded-for", "198.51.100.1")])
+    assert identity(spoofed) == "ip:203.0.113.7"
+
+    proxied = http_scope(client=("10.0.0.2", 80), headers=[("x-forwarded-for", "198.51.100.1, 203.0.113.9, 10.0.0.5")])
+    # Left-most entries are client-supplied; the first untrusted hop from the right is the caller
+    assert identity(proxied) == "ip:203.0.113.9"
+
+
+def test_only_known_api_keys_identify_a_client():
+    identity = ClientIdentity(api_keys=["secret-1"])
+    assert identity(http_scope(headers=[("x-api-key", "made-up")])) == "ip:203.0.113.7"
+    known = identity(http_scope(headers=[("x-api-key", "secret-1")]))
+    assert known.startswith("key:") and "secret-1" not in known
+
+
+def test_client_name_never_changes_the_rate_limit_key():
+    identity = ClientIdentity()
+    scope = http_scope(headers=[("x-client-name", "kiosk")])
+    assert identity(scope) == "ip:203.0.113.7"
+
+
+def test_stable_id_ignores_the_network():
+    identity = ClientIdentity(api_keys=["secret-1"])
+    wifi = http_scope(client=("203.0.113.7", 5000), headers=[("x-client-name", "kiosk")])
+    cellular = http_scope(client=("198.51.100.4", 6000), headers=[("x-client-name", "kiosk")])
+    assert identity.stable_id(wifi) == identity.stable_id(cellular) == "anonymous|client:kiosk"
+    keyed = identity.stable_id(http_scope(headers=[("x-api-key", "secret-1")]))
+    assert keyed.startswith("key:") and "secret-1" not in keyed
+
+
+def test_unlimited_paths_pass_through():
+    middleware = RateLimitMiddleware(ok_app, InMemoryBackend(), [Rule("/api/health", None)])
+    assert asyncio.run(call(middleware, http_scope(path="/api/health/live", method="GET"))) == 200
+
+
+def test_untrusted_forwarding_warns_once(caplog):
+    identity = ClientIdentity()
+    scope = http_scope(client=("10.0.0.2", 80), headers=[("x-forwarded-for", "203.0.113.9")])
+    with caplog.at_level("WARNING", logger="rate_limit"):
+        assert identity(scope) == "ip:10.0.0.2"
+        identity(scope)
+    warnings = [r for r in caplog.records if "TRUSTED_PROXIES" in r.getMessage()]
+    assert len(warnings) == 1
@@ -0,0 +1,71 @@
+# Change feed fan-out, topic filtering and slow-consumer backpressure
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from realtime import ChangeBroker, InProcessPubSub, Subscription, diff_fields
+
+
+def drain(subscription):
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(json.loads(subscription.queue.get_nowait()))
+    return messages
+
+
+def test_diff_fields_keeps_only_changes():
+    before = {"_id": 1, "name": "Taco", "price": 3}
+    assert diff_fields(before, {"_id": 1, "name": "Taco", "price": 4}) == {"price": 4}
+    assert diff_fields(None, {"_id": 1, "name": "Taco"}) == {"name": "Taco"}
+
+
+def test_slow_consumer_gets_resync_instead_of_unbounded_backlog():
+    subscription = Subscription(None, max_queue=3)
+    for i in range(3):
+        subscription.offer("menu_items", json.dumps({"n": i}))
+    subscription.offer("menu_items", json.dumps({"n": 3}))
+    assert drain(subscription) == [{"type": "resync", "dropped": 3}]
+    assert subscription.queue.maxsize == 3
+
+    # After resyncing the client receives live changes again
+    subscription.offer("menu_items", json.dumps({"n": 4}))
+    assert drain(subscription) == [{"n": 4}]
+
+
+def test_topic_filter():
+    subscription = Subscription({"locations"}, max_queue=10)
+    subscription.offer("menu_items", "{}")
+    subscription.offer("locations", "{}")
+    assert subscription.queue.qsize() == 1
+
+
+def test_broker_fans_out_once_encoded():
+    async def run():
+        broker = ChangeBroker(InProcessPubSub(), max_queue=10)
+        await broker.start()
+        everything = broker.subscribe()
+        menu_only = broker.subscribe(["menu_items", "bogus"])
+        await broker.publish("locations", "delete", "l1")
+        await broker.publish("menu_items", "update", "m1", {"price": 4})
+        broker.unsubscribe(menu_only)
+        await broker.publish("menu_items", "delete", "m1")
+        return drain(everything), drain(menu_only)
+
+    everything, menu_only = asyncio.run(run())
+    assert [(m["collection"], m["op"]) for m in everything] == [
+        ("locations", "delete"), ("menu_items", "update"), ("menu_items", "delete"),
+    ]
+    assert [(m["id"], m["data"]) for m in menu_only] == [("m1", {"price": 4})]
+
+
+def test_publish_failure_does_not_raise():
+    class BrokenBackend(InProcessPubSub):
+        async def publish(self, message):
+            raise RuntimeError("feed down")
+
+    asyncio.run(ChangeBroker(BrokenBackend()).publish("menu_items", "insert", "m1"))
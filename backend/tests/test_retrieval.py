@@ -0,0 +1,88 @@
+# Catalog index: direct answers only for questions about the truck
+
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from ai_agents.retrieval import CatalogIndex, schedule_days
+
+
+def build_index() -> CatalogIndex:
+    index = CatalogIndex()
+    index.upsert("truck", "food_truck_info", {
+        "name": "Tasty Wheels Food Truck",
+        "description": "Serving delicious street food with fresh ingredients and bold flavors",
+        "phone": "(555) 123-4567",
+        "email": "info@tastywheels.com",
+    })
+    index.upsert("location", "l1", {
+        "name": "Downtown Plaza", "address": "123 Main St, Downtown",
+        "schedule": "Mon-Fri: 11:30AM-2:30PM", "active": True,
+    })
+    index.upsert("location", "l2", {
+        "name": "Business District", "address": "456 Corporate Blvd",
+        "schedule": "Mon-Fri: 12:00PM-3:00PM", "active": True,
+    })
+    index.upsert("menu", "m1", {
+        "name": "Fish Tacos", "description": "Crispy fish with cabbage slaw and lime crema",
+        "price": 9.99, "category": "Tacos", "available": True,
+    })
+    index.upsert("menu", "m2", {
+        "name": "Loaded Fries", "description": "Crispy fries topped with cheese and bacon",
+        "price": 7.99, "category": "Sides", "available": False,
+    })
+    return index
+
+
+def test_general_questions_go_to_the_llm():
+    index = build_index()
+    for question in (
+        "Is OpenAI open source?",
+        "Where is the Eiffel Tower?",
+        "latest news on the facebook outage",
+        "What are the opening hours of the Louvre?",
+        "Should I call a plumber or fix it myself?",
+    ):
+        assert index.answer(question) is None, question
+
+
+def test_location_questions_addressed_to_us():
+    index = build_index()
+    answer = index.answer("Where are you today?")
+    assert "Downtown Plaza" in answer and "Business District" in answer
+    assert "Downtown Plaza" in index.answer("What are your hours?")
+    assert "Downtown Plaza" in index.answer("Where can I find you on Friday?")
+    assert index.answer("Where are you on Saturday?") == "We don't have any scheduled stops on Saturday right now."
+
+
+def test_location_named_by_strong_index_hit():
+    assert "Business District" in build_index().answer("Where is Business District?")
+
+
+def test_contact_questions():
+    index = build_index()
+    assert "(555) 123-4567" in index.answer("What's your phone number?")
+    assert "(555) 123-4567" in index.answer("How do I contact Tasty Wheels?")
+
+
+def test_menu_answers_need_every_term():
+    index = build_index()
+    assert index.answer("Do you have fish tacos?") == "Yes, we have Fish Tacos for $9.99."
+    assert index.answer("Do you have vegetarian tacos?") is None
+    assert "sold out" in index.answer("How much are the loaded fries?")
+
+
+def test_remove_keeps_rows_dense():
+    index = build_index()
+    index.remove("l1")
+    assert len(index) == 4
+    assert index.rows["m2"] < len(index)
+    assert all(entry.doc_id != "l1" for _, entry in index.search("downtown plaza", k=10))
+
+
+def test_schedule_days():
+    assert schedule_days("Mon-Fri: 11:30AM-2:30PM") == {0, 1, 2, 3, 4}
+    assert schedule_days("Sat-Mon") == {5, 6, 0}
+    assert schedule_days(None) == set(range(7))
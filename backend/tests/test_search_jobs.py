@@ -0,0 +1,137 @@
+# Search job runner: bounded queue under concurrent submits, restarts and job deadlines
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+from ai_agents.agents import AgentResponse
+from search_jobs import JobQueueFull, SearchJobRunner
+
+
+class SlowInsertCollection:
+    # Yields on insert like a real round trip so submits interleave
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0.01)
+        return await self.collection.insert_one(doc)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+async def noop_handler(job, progress):
+    return {"success": True}
+
+
+def test_concurrent_submits_respect_the_queue_bound():
+    async def run():
+        collection = AsyncMongoMockClient()["jobs"]["search_jobs"]
+        runner = SearchJobRunner(SlowInsertCollection(collection), noop_handler, workers=0, max_queue=2)
+        results = await asyncio.gather(*[runner.submit({"query": str(i)}) for i in range(5)], return_exceptions=True)
+        stored = await collection.count_documents({})
+        return results, stored, runner.queue.qsize()
+
+    results, stored, queued = asyncio.run(run())
+    assert sum(isinstance(r, dict) for r in results) == 2
+    assert sum(isinstance(r, JobQueueFull) for r in results) == 3
+    # Rejected submits never leave a document stuck in "queued"
+    assert stored == 2 and queued == 2
+
+
+def test_failed_insert_releases_its_slot():
+    class FailingCollection:
+        async def insert_one(self, doc):
+            raise RuntimeError("mongo down")
+
+    async def run():
+        runner = SearchJobRunner(FailingCollection(), noop_handler, workers=0, max_queue=1)
+        with pytest.raises(RuntimeError):
+            await runner.submit({"query": "x"})
+        return runner._reserved
+
+    assert asyncio.run(run()) == 0
+
+
+def test_jobs_run_to_completion_and_long_poll_wakes():
+    async def run():
+        runner = SearchJobRunner(AsyncMongoMockClient()["jobs"]["search_jobs"], noop_handler, workers=1)
+        await runner.start()
+        job = await runner.submit({"query": "tacos"})
+        done = await runner.get(job["id"], wait=2)
+        await runner.stop()
+        return done
+
+    done = asyncio.run(run())
+    assert done["status"] == "completed" and done["progress"] == 1.0
+
+
+def test_queued_jobs_survive_a_restart():
+    async def run():
+        collection = AsyncMongoMockClient()["jobs"]["search_jobs"]
+        # Submitted to a process that died before any worker picked them up
+        before = SearchJobRunner(collection, noop_handler, workers=0, max_queue=3)
+        jobs = [await before.submit({"query": str(i)}) for i in range(3)]
+
+        after = SearchJobRunner(collection, noop_handler, workers=1, max_queue=2)
+        await after.start()
+        results = [await after.get(job["id"], wait=2) for job in jobs]
+        await after.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert [job["status"] for job in results] == ["completed", "completed", "failed"]
+    # The overflow is failed with an expiry instead of lingering as "queued"
+    assert results[2]["error"] == "Job interrupted" and results[2]["expires_at"]
+
+
+def test_a_job_claimed_elsewhere_is_not_run_twice():
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job["id"])
+        return {"success": True}
+
+    async def run():
+        collection = AsyncMongoMockClient()["jobs"]["search_jobs"]
+        runner = SearchJobRunner(collection, handler, workers=0)
+        job = await runner.submit({"query": "tacos"})
+        await collection.update_one({"id": job["id"]}, {"$set": {"status": "running"}})
+        runner._tasks = [asyncio.create_task(runner._worker(0))]
+        await runner.queue.join()
+        await runner.stop()
+
+    asyncio.run(run())
+    assert calls == []
+
+
+def test_jobs_use_their_own_deadline(monkeypatch):
+    import server
+
+    seen = []
+
+    class FakeAgent:
+        async def execute(self, prompt, use_tools=True, timeout=None):
+            seen.append(timeout)
+            return AgentResponse(success=True, content="done", metadata={})
+
+    async def progress(stage, fraction):
+        pass
+
+    monkeypatch.setattr(server, "search_agent", FakeAgent())
+    monkeypatch.setattr(server.search_jobs, "job_timeout", 900)
+    monkeypatch.setattr(server.catalog_index, "answer", lambda query: None)
+
+    asyncio.run(server.run_search_job({"params": {"query": "street food trends"}}, progress))
+    asyncio.run(server.run_search_job({"params": {"query": "street food trends", "timeout_ms": 5000}}, progress))
+    assert seen == [900, 5.0]
@@ -0,0 +1,69 @@
+# Static export: manifest, precompressed variants, idempotent rewrites and pruning
+
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import static_export
+from static_export import MANIFEST_NAME, write_export
+
+SECTIONS = {"menu": b'[{"name":"Taco"}]', "foodtruck": b'{"name":"Truck"}'}
+
+
+def test_manifest_lists_files_and_encodings(tmp_path):
+    manifest = write_export(tmp_path, SECTIONS)
+    assert json.loads((tmp_path / MANIFEST_NAME).read_bytes()) == manifest
+
+    entry = manifest["files"]["menu"]
+    assert entry["path"] == f"menu.{entry['sha256']}.json"
+    assert (tmp_path / entry["path"]).read_bytes() == SECTIONS["menu"]
+    gz = entry["encodings"]["gzip"]
+    assert gzip.decompress((tmp_path / gz["path"]).read_bytes()) == SECTIONS["menu"]
+    assert gz["bytes"] == (tmp_path / gz["path"]).stat().st_size
+
+
+def test_brotli_variant_when_available(tmp_path):
+    manifest = write_export(tmp_path, SECTIONS)
+    encodings = manifest["files"]["menu"]["encodings"]
+    if static_export.brotli is None:
+        assert set(encodings) == {"gzip"}
+    else:
+        br = encodings["br"]
+        assert static_export.brotli.decompress((tmp_path / br["path"]).read_bytes()) == SECTIONS["menu"]
+
+
+def test_rewrites_are_idempotent(tmp_path):
+    first = write_export(tmp_path, SECTIONS)
+    files = {path.name: path.read_bytes() for path in tmp_path.iterdir() if path.name != MANIFEST_NAME}
+    second = write_export(tmp_path, SECTIONS)
+    assert first["files"] == second["files"]
+    # Byte-identical output, including gzip, and no extra files
+    assert {path.name: path.read_bytes() for path in tmp_path.iterdir() if path.name != MANIFEST_NAME} == files
+
+
+def test_superseded_versions_linger_then_get_pruned(tmp_path):
+    old = write_export(tmp_path, {"menu": b"[1]"}, keep_seconds=600)
+    old_path = tmp_path / old["files"]["menu"]["path"]
+    # v1 was published two hours ago and re-exported unchanged ever since
+    two_hours_ago = time.time() - 7200
+    for path in tmp_path.iterdir():
+        os.utime(path, (two_hours_ago, two_hours_ago))
+    write_export(tmp_path, {"menu": b"[1]"}, keep_seconds=600)
+
+    # Replacing it keeps v1 around for clients still holding the old manifest
+    write_export(tmp_path, {"menu": b"[1,2]"}, keep_seconds=600)
+    assert old_path.exists()
+
+    # Once it has been superseded for longer than keep_seconds it goes
+    for path in tmp_path.glob("menu.*"):
+        if path.name.startswith(old_path.name):
+            os.utime(path, (two_hours_ago, two_hours_ago))
+    current = write_export(tmp_path, {"menu": b"[1,2]"}, keep_seconds=600)
+    assert not old_path.exists()
+    assert (tmp_path / current["files"]["menu"]["path"]).exists()
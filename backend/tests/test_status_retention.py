@@ -0,0 +1,177 @@
+# Status retention: hourly archive watermark, rollup merge and TTL ordering
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from status_retention import STATE_ID, StatusRetention
+
+
+class _Result:
+    def __init__(self, pending):
+        self.pending = pending
+
+    async def to_list(self, length):
+        return await self.pending
+
+
+class _StatusChecks:
+    # mongomock implements neither $dateFromString nor $merge: run the pipeline up to the merge, then apply it here
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = collection
+        # Whether a TTL index was already live each time an archive chunk ran
+        self.ttl_during_archive = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def aggregate(self, pipeline):
+        return _Result(self._aggregate(pipeline))
+
+    async def _aggregate(self, pipeline):
+        indexes = await self.collection.index_information()
+        self.ttl_during_archive.append(any("expireAfterSeconds" in spec for spec in indexes.values()))
+        *stages, merge = pipeline
+        group = stages[1]["$group"]["_id"]
+        group["bucket_start"] = group["bucket_start"]["$dateFromString"]["dateString"]
+        rows = await self.collection.aggregate(stages).to_list(None)
+        spec = merge["$merge"]
+        target = self.db[spec["into"]]
+        for row in rows:
+            row["bucket_start"] = datetime.strptime(row["bucket_start"], "%Y-%m-%dT%H:00:00Z")
+            match = {field: row[field] for field in spec["on"]}
+            existing = await target.find_one(match)
+            if existing:
+                # whenMatched keeps the larger count
+                await target.update_one(match, {"$set": {"count": max(existing["count"], row["count"])}})
+            else:
+                await target.insert_one(row)
+        return []
+
+
+class ArchiveDb:
+    def __init__(self):
+        self.mock = AsyncMongoMockClient()["retention_test"]
+        self.status_checks = _StatusChecks(self.mock, self.mock.status_checks)
+        self.commands = []
+
+    def __getattr__(self, name):
+        return getattr(self.mock, name)
+
+    def __getitem__(self, name):
+        return self.status_checks if name == "status_checks" else self.mock[name]
+
+    async def command(self, name, collection, **kwargs):
+        # collMod retunes the TTL of an existing index in place
+        self.commands.append((name, collection, kwargs))
+        index = kwargs["index"]
+        field = next(iter(index["keyPattern"]))
+        for spec_name, spec in (await self.mock[collection].index_information()).items():
+            if spec["key"] == [(field, 1)]:
+                await self.mock[collection].drop_index(spec_name)
+                await self.mock[collection].create_index(field, name=spec_name, expireAfterSeconds=index["expireAfterSeconds"])
+
+
+def ttl_seconds(db, collection="status_checks", field="timestamp"):
+    async def run():
+        indexes = await db.mock[collection].index_information()
+        return next((spec.get("expireAfterSeconds") for spec in indexes.values() if spec["key"] == [(field, 1)]), None)
+    return asyncio.run(run())
+
+
+def test_archive_moves_the_watermark_and_keeps_the_larger_count():
+    db = ArchiveDb()
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    retention = StatusRetention(db, retention_days=30, minute_rollup_days=0)
+
+    async def run():
+        await db.status_checks.insert_many([
+            {"client_name": "a", "timestamp": hour + timedelta(minutes=m)} for m in (1, 2, 3)
+        ] + [{"client_name": "b", "timestamp": hour + timedelta(hours=1, minutes=5)}])
+        # A rollup written before part of the hour expired holds more than is left raw
+        await db.status_rollups_hour.insert_one({"client_name": "b", "bucket_start": hour + timedelta(hours=1), "count": 9})
+        archived = await retention.archive_completed_hours(max_hours=2)
+        state = await db.maintenance_state.find_one({"_id": STATE_ID})
+        more = await retention.catch_up()
+        rollups = await db.status_rollups_hour.find({}, {"_id": 0}).sort("client_name", 1).to_list(None)
+        final = await db.maintenance_state.find_one({"_id": STATE_ID})
+        return archived, state["watermark"], more, rollups, final["watermark"]
+
+    archived, watermark, more, rollups, final = asyncio.run(run())
+    assert archived == 2 and watermark == hour + timedelta(hours=2)
+    assert more == 1 and final == hour + timedelta(hours=3)
+    assert [(r["client_name"], r["bucket_start"], r["count"]) for r in rollups] == [
+        ("a", hour, 3),
+        ("b", hour + timedelta(hours=1), 9),
+    ]
+
+
+def test_setup_leaves_raw_ttl_to_the_archive():
+    db = ArchiveDb()
+    asyncio.run(StatusRetention(db, retention_days=30, minute_rollup_days=7).setup())
+    assert ttl_seconds(db) is None
+    assert ttl_seconds(db, "status_rollups_minute", "bucket_start") == 7 * 86400
+
+    plain = ArchiveDb()
+    asyncio.run(StatusRetention(plain, retention_days=30, minute_rollup_days=0, archive=False).setup())
+    assert ttl_seconds(plain) == 30 * 86400
+
+
+def test_ttl_applied_only_after_catch_up():
+    db = ArchiveDb()
+    retention = StatusRetention(db, retention_days=1, minute_rollup_days=0)
+    old = datetime.utcnow() - timedelta(days=10)
+
+    async def run():
+        await db.status_checks.insert_one({"client_name": "a", "timestamp": old})
+        task = asyncio.create_task(retention.run_periodically(3600))
+        while retention.last_run is None:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return await db.maintenance_state.find_one({"_id": STATE_ID})
+
+    state = asyncio.run(run())
+    assert state["watermark"] == datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    # Ten days of hours took two chunks, all of them before the TTL existed
+    assert len(db.status_checks.ttl_during_archive) > 1 and not any(db.status_checks.ttl_during_archive)
+    assert ttl_seconds(db) == 86400
+
+
+def test_ensure_ttl_retunes_in_place():
+    db = ArchiveDb()
+    retention = StatusRetention(db, retention_days=30, minute_rollup_days=0)
+
+    async def run():
+        await retention._ensure_ttl("status_checks", "timestamp", 30)
+        await retention._ensure_ttl("status_checks", "timestamp", 30)
+        assert db.commands == []
+        await retention._ensure_ttl("status_checks", "timestamp", 10)
+
+    asyncio.run(run())
+    assert db.commands == [("collMod", "status_checks", {"index": {"keyPattern": {"timestamp": 1}, "expireAfterSeconds": 864000}})]
+    assert ttl_seconds(db) == 864000
+
+
+def test_plain_index_replaced_by_ttl():
+    db = ArchiveDb()
+
+    async def run():
+        await db.mock.status_checks.create_index("timestamp")
+        await StatusRetention(db, retention_days=2, minute_rollup_days=0)._ensure_ttl("status_checks", "timestamp", 2)
+
+    asyncio.run(run())
+    assert ttl_seconds(db) == 2 * 86400
+
+
+def test_retention_is_off_by_default(monkeypatch):
+    from status_retention import create_status_retention
+
+    monkeypatch.delenv("STATUS_RETENTION_DAYS", raising=False)
+    assert create_status_retention(ArchiveDb()).retention_days == 0
@@ -0,0 +1,58 @@
+# /status/summary window limits and truncation
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+import server
+
+
+def summarize(monkeypatch, rows=(), **kwargs):
+    db = AsyncMongoMockClient()["summary_test"]
+    monkeypatch.setattr(server, "db", db)
+
+    async def run():
+        if rows:
+            await db.status_rollups_hour.insert_many([dict(row) for row in rows])
+        return await server.get_status_summary(**{"start": None, "end": None, "client_name": None, **kwargs})
+
+    return asyncio.run(run())
+
+
+def test_window_too_wide_for_bucket_is_rejected(monkeypatch):
+    end = datetime(2026, 1, 8)
+    with pytest.raises(HTTPException) as error:
+        summarize(monkeypatch, bucket="minute", start=end - timedelta(days=7), end=end)
+    assert error.value.status_code == 400
+
+
+def test_totals_cover_rows_cut_from_the_bucket_list(monkeypatch):
+    monkeypatch.setattr(server, "MAX_SUMMARY_BUCKETS", 4)
+    end = datetime(2026, 1, 1, 3)
+    rows = [
+        {"bucket_start": end - timedelta(hours=h), "client_name": name, "count": 1}
+        for h in (1, 2, 3) for name in ("a", "b")
+    ]
+    summary = summarize(monkeypatch, rows, bucket="hour", start=end - timedelta(hours=3), end=end)
+    assert summary.truncated
+    assert len(summary.buckets) == 4
+    assert summary.totals == {"a": 3, "b": 3}
+
+
+def test_small_window_is_complete(monkeypatch):
+    end = datetime(2026, 1, 1, 3)
+    rows = [{"bucket_start": end - timedelta(hours=1), "client_name": "a", "count": 5}]
+    summary = summarize(monkeypatch, rows, bucket="hour", start=end - timedelta(hours=3), end=end)
+    assert not summary.truncated
+    assert summary.totals == {"a": 5}
@@ -0,0 +1,91 @@
+# Delta sync cursors against an in-memory Mongo
+
+import asyncio
+import os
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+from mongomock_motor import AsyncMongoMockClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_foodtruck")
+
+import server
+
+
+def menu_doc(item_id: str, updated_at, deleted_at=None) -> dict:
+    return {
+        "id": item_id, "name": item_id, "description": "", "price": 1.0, "category": "Sides",
+        "available": True, "created_at": updated_at, "updated_at": updated_at, "deleted_at": deleted_at,
+    }
+
+
+def run_sync(monkeypatch, docs, since=None, limit=500):
+    db = AsyncMongoMockClient()["sync_test"]
+    monkeypatch.setattr(server, "db", db)
+
+    async def run():
+        if docs:
+            await db.menu_items.insert_many(docs)
+        return await server.sync_catalog(since=since, limit=limit)
+
+    return asyncio.run(run())
+
+
+def test_cursor_round_trip():
+    positions = {"menu_items": [1700000000000, "abc"]}
+    assert server.decode_sync_cursor(server.encode_sync_cursor(positions)) == positions
+
+
+def test_old_changes_advance_the_cursor(monkeypatch):
+    old = server.utcnow_ms() - timedelta(minutes=5)
+    response = run_sync(monkeypatch, [menu_doc("a", old), menu_doc("b", old, deleted_at=old)])
+    assert [item.id for item in response.menu_items] == ["a"]
+    assert response.deleted == {"menu_items": ["b"]}
+    position = server.decode_sync_cursor(response.cursor)["menu_items"]
+    assert position == [(old - server.EPOCH) // timedelta(milliseconds=1), "b"]
+
+
+def test_cursor_never_passes_the_safety_window(monkeypatch):
+    now = server.utcnow_ms()
+    response = run_sync(monkeypatch, [menu_doc("fresh", now)])
+    # Delivered now, but the cursor stays behind it so a slower commit stamped earlier is still found
+    assert [item.id for item in response.menu_items] == ["fresh"]
+    position = server.decode_sync_cursor(response.cursor)["menu_items"]
+    assert position[1] == ""
+    window_ms = server.SYNC_SAFETY_WINDOW // timedelta(milliseconds=1)
+    assert position[0] <= (now - server.EPOCH) // timedelta(milliseconds=1) - window_ms + 1000
+
+    # A write stamped before "fresh" that commits after the first sync is still picked up
+    late = menu_doc("late", now - timedelta(seconds=1))
+    again = run_sync(monkeypatch, [menu_doc("fresh", now), late], since=response.cursor)
+    assert {item.id for item in again.menu_items} == {"fresh", "late"}
+
+
+def test_full_page_sets_has_more(monkeypatch):
+    old = server.utcnow_ms() - timedelta(minutes=5)
+    response = run_sync(monkeypatch, [menu_doc(f"i{n}", old) for n in range(3)], limit=2)
+    assert response.has_more
+    rest = run_sync(monkeypatch, [menu_doc(f"i{n}", old) for n in range(3)], since=response.cursor, limit=2)
+    assert [item.id for item in rest.menu_items] == ["i2"]
+    assert not rest.has_more
+
+
+def test_paging_through_the_safety_window(monkeypatch):
+    now = server.utcnow_ms()
+    docs = [menu_doc(f"i{n}", now - timedelta(milliseconds=5 - n)) for n in range(5)]
+    pages, cursor = [], None
+    for _ in range(4):
+        response = run_sync(monkeypatch, docs, since=cursor, limit=2)
+        pages.append([item.id for item in response.menu_items])
+        cursor = response.cursor
+        if not response.has_more:
+            break
+    assert pages == [["i0", "i1"], ["i2", "i3"], ["i4"]]
+    # The settled position never moved into the window, so the next pass rescans it
+    assert len(server.decode_sync_cursor(cursor)["menu_items"]) == 2
+    again = run_sync(monkeypatch, docs, since=cursor, limit=2)
+    assert [item.id for item in again.menu_items] == ["i0", "i1"] and again.has_more
@@ -188,15 +188,11 @@ const Home = () => {
 
   const fetchData = async () => {
     try {
-      const [infoResponse, menuResponse, locationsResponse] = await Promise.all([
-        axios.get(`${API}/foodtruck`),
-        axios.get(`${API}/menu`),
-        axios.get(`${API}/locations`)
-      ]);
-
-      setFoodTruckInfo(infoResponse.data);
-      setMenuItems(menuResponse.data);
-      setLocations(locationsResponse.data);
+      const { data } = await axios.get(`${API}/bootstrap`);
+
+      setFoodTruckInfo(data.foodtruck);
+      setMenuItems(data.menu);
+      setLocations(data.locations);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {